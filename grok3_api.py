@@ -1,23 +1,32 @@
 import time
-import pyperclip
 import subprocess
 import os
+import sys
+import json
+import hashlib
+import shutil
 import cv2
 import numpy as np
 import mss
 import mimetypes
 import io
-import win32clipboard
 from PIL import Image
+from collections import deque
 from functools import wraps
+from grok_automation import Automation
+from grok_trace import TraceRecorder, read_trace, decode_frame, DEFAULT_MAX_BYTES
 
 # Constants
 TEMPLATES_DIR = "grok_templates"
 WINDOW_ID_FILE = "grok_window_id.txt"
 
 # Import required modules
-import pyautogui
-import win32gui
+# Windows 后端依赖 pyautogui/pywin32，Linux 使用 grok_x11 中的原生 X11 后端
+if sys.platform == "win32":
+    import pyautogui
+    import pyperclip
+    import win32clipboard
+    import win32gui
 
 def retry_on_failure(func):
     """Decorator to retry a function on failure."""
@@ -29,16 +38,16 @@ def retry_on_failure(func):
             return kwargs.get('default', None)
     return wrapper
 
-def wait_for_condition(condition_func, timeout=5.0, interval=0.1):
+def wait_for_condition(condition_func, timeout=5.0, interval=0.1, clock=time.time, sleep=time.sleep):
     """Wait for a condition to be met within a timeout."""
-    start = time.time()
-    while time.time() - start < timeout:
+    start = clock()
+    while clock() - start < timeout:
         if result := condition_func():
             return result
-        time.sleep(interval)
+        sleep(interval)
     return None
 
-class WindowsAutomation:
+class WindowsAutomation(Automation):
     @staticmethod
     @retry_on_failure
     def run(action, *args):
@@ -47,6 +56,8 @@ class WindowsAutomation:
                 pyautogui.click(x=args[0], y=args[1])
             elif action == 'mousemove':
                 pyautogui.moveTo(x=args[0], y=args[1])
+            elif action == 'type':
+                pyautogui.typewrite(args[0])
             elif action == 'key':
                 # 改进按键处理
                 if len(args) == 1:
@@ -74,15 +85,110 @@ class WindowsAutomation:
         except Exception:
             return False
 
+    @staticmethod
+    def find_window(title):
+        # EnumWindows 按 Z 序枚举，第一个匹配的就是最上层的窗口
+        matches = []
+        def collect(hwnd, _):
+            if win32gui.IsWindowVisible(hwnd) and title.lower() in win32gui.GetWindowText(hwnd).lower():
+                matches.append(hwnd)
+        try:
+            win32gui.EnumWindows(collect, None)
+        except Exception:
+            return None
+        return matches[0] if matches else None
+
+    @staticmethod
+    def is_window(hwnd):
+        try:
+            return bool(win32gui.IsWindow(hwnd))
+        except Exception:
+            return False
+
+    @staticmethod
+    def get_window_rect(hwnd):
+        return win32gui.GetWindowRect(hwnd)
+
+    @staticmethod
+    def clipboard_copy(text):
+        pyperclip.copy(text)
+
+    @staticmethod
+    def clipboard_paste():
+        return pyperclip.paste()
+
+    @staticmethod
+    def clipboard_copy_image(file_path):
+        try:
+            # 剪贴板的 CF_DIB 格式即去掉文件头的 BMP
+            output = io.BytesIO()
+            Image.open(file_path).convert('RGB').save(output, 'BMP')
+            win32clipboard.OpenClipboard()
+            try:
+                win32clipboard.EmptyClipboard()
+                win32clipboard.SetClipboardData(win32clipboard.CF_DIB, output.getvalue()[14:])
+            finally:
+                win32clipboard.CloseClipboard()
+            return True
+        except Exception:
+            return False
+
+def _default_automation():
+    """Pick the native automation backend for this platform."""
+    if sys.platform == "win32":
+        return WindowsAutomation()
+    from grok_x11 import X11Automation
+    return X11Automation()
+
 class GrokAPI:
-    def __init__(self, url="https://grok.com", reuse_window=False, anonymous_chat=False):
+    def __init__(self, url="https://grok.com", reuse_window=False, anonymous_chat=False,
+                 trace_path=None, trace_max_bytes=DEFAULT_MAX_BYTES, automation=None):
         os.makedirs(TEMPLATES_DIR, exist_ok=True)
+        self.automation = automation or _default_automation()
         self.url = url
         self.reuse_window = reuse_window
         self.anonymous_chat = anonymous_chat
         self.window_id = None
         self.templates = self._load_templates()
         self.template_cache = self._preload_templates()
+        # 可选的会话记录器，用于事后复现问题
+        self.recorder = TraceRecorder(trace_path, max_bytes=trace_max_bytes) if trace_path else None
+
+    def close_trace(self):
+        """Flush and close the session trace, if recording."""
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    # 所有与外部环境的交互都经过以下方法，便于记录和回放
+    def _sleep(self, seconds):
+        time.sleep(seconds)
+
+    def _clock(self):
+        return time.time()
+
+    def _run(self, action, *args):
+        result = self.automation.run(action, *args)
+        if self.recorder:
+            self.recorder.record_action(action, args, result)
+        return result
+
+    def _activate_window(self, hwnd):
+        result = self.automation.activate_window(hwnd)
+        if self.recorder:
+            self.recorder.record_action('activate', (hwnd,), result)
+        return result
+
+    def _clipboard_copy(self, text):
+        self.automation.clipboard_copy(text)
+        if self.recorder:
+            self.recorder.record_clipboard('copy', text)
+
+    def _clipboard_paste(self):
+        text = self.automation.clipboard_paste()
+        if self.recorder:
+            self.recorder.record_clipboard('paste', text)
+        return text
 
     def _preload_templates(self):
         """Preload UI templates into memory."""
@@ -131,36 +237,45 @@ class GrokAPI:
                 wid = self._load_window_id()
                 if wid:
                     # 尝试激活窗口
-                    if WindowsAutomation.activate_window(wid):
+                    if self._activate_window(wid):
                         # 验证窗口是否真的存在且可用
-                        try:
-                            if win32gui.IsWindow(wid):
-                                self.window_id = wid
-                                return wid
-                        except Exception:
-                            pass
+                        if self.automation.is_window(wid):
+                            self.window_id = wid
+                            return wid
                     # 如果窗口无效，删除ID文件
                     os.remove(WINDOW_ID_FILE)
     
-        browsers = {
-            "chrome": r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-            "edge": r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
-            "firefox": r"C:\Program Files\Mozilla Firefox\firefox.exe"
-        }
+        if sys.platform == "win32":
+            browsers = {
+                "chrome": r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+                "edge": r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+                "firefox": r"C:\Program Files\Mozilla Firefox\firefox.exe"
+            }
+        else:
+            browsers = {name: shutil.which(name) or "" for name in
+                        ("google-chrome", "chromium", "chromium-browser", "firefox")}
     
         # 只尝试打开第一个可用的浏览器
         for name, path in browsers.items():
             if os.path.exists(path):
                 try:
+                    # 启动前的活动窗口通常是运行脚本的终端，不能当作浏览器窗口
+                    previous_window = self.automation.get_active_window()
                     # 使用--new-instance参数确保创建新的浏览器实例
                     process = subprocess.Popen([path, "--new-instance", "--new-window", self.url])
                     # 等待浏览器窗口出现
                     for _ in range(10):  # 最多等待5秒
-                        time.sleep(0.5)
-                        self.window_id = WindowsAutomation.get_active_window()
+                        self._sleep(0.5)
+                        self.window_id = self.automation.find_window("Grok")
                         if self.window_id:
-                            self._save_window_id(self.window_id)
-                            return self.window_id
+                            break
+                    else:
+                        # 按标题找不到时，退回到启动后新获得焦点的窗口
+                        active = self.automation.get_active_window()
+                        self.window_id = active if active and active != previous_window else None
+                    if self.window_id:
+                        self._save_window_id(self.window_id)
+                        return self.window_id
                     # 如果无法获取窗口ID，终止进程
                     process.terminate()
                 except Exception as e:
@@ -172,15 +287,20 @@ class GrokAPI:
             print("Error: Failed to open browser")
         return self.window_id
     
-    # 在类中替换所有 XdotoolWrapper 的使用为 WindowsAutomation
     def _capture_screenshot(self):
         """Capture a screenshot of the active window."""
+        frame = self._grab_screenshot()
+        if self.recorder:
+            self.recorder.record_frame(frame)
+        return frame
+
+    def _grab_screenshot(self):
         with mss.mss() as sct:
             if not self.window_id:
                 return np.array(sct.grab(sct.monitors[1]))
             try:
-                # Get window position and size using win32gui
-                rect = win32gui.GetWindowRect(self.window_id)
+                # Get window position and size from the automation backend
+                rect = self.automation.get_window_rect(self.window_id)
                 x, y = rect[0], rect[1]
                 w, h = rect[2] - rect[0], rect[3] - rect[1]
                 monitor = {"top": y, "left": x, "width": w, "height": h}
@@ -241,28 +361,33 @@ class GrokAPI:
     def _wait_for_template(self, template_key, alt_key=None, timeout=3.0, interval=0.5, confidence=0.7):
         """Wait for a template to appear."""
         templates = [template_key] + ([alt_key] if alt_key in self.templates else [])
-        return wait_for_condition(lambda: next((pos for t in templates if (pos := self._find_template(t, confidence))), None), timeout, interval)
+        return wait_for_condition(lambda: next((pos for t in templates if (pos := self._find_template(t, confidence))), None),
+                                  timeout, interval, clock=self._clock, sleep=self._sleep)
 
     def _copy_file(self, file_path):
         """Copy a file to the clipboard."""
+        result = self._copy_file_to_clipboard(file_path)
+        if self.recorder:
+            self.recorder.record_clipboard('copy_file', file_path, result)
+        return result
+
+    def _copy_file_to_clipboard(self, file_path):
         if not os.path.exists(file_path):
             return False
         mime_type, _ = mimetypes.guess_type(file_path)
         if mime_type and mime_type.startswith('image/'):
-            try:
-                subprocess.run(f'convert "{file_path}" png:- | xclip -selection clipboard -t image/png', shell=True, check=True, timeout=10)
-                return True
-            except Exception:
-                return False
+            return self.automation.clipboard_copy_image(file_path)
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                pyperclip.copy(f.read())
+                self.automation.clipboard_copy(f.read())
             return True
         except Exception:
             return False
 
     def send_message(self, message="", file_paths=None):
         """Send a message with optional files."""
+        if self.recorder:
+            self.recorder.record_call('send_message', message=message, file_paths=file_paths, window_id=self.window_id)
         if not self.templates:
             print("Error: No templates loaded")
             return False
@@ -276,13 +401,13 @@ class GrokAPI:
         # 多次尝试激活窗口，增加等待时间
         window_activated = False
         for attempt in range(3):  # 重试次数改为3次
-            if WindowsAutomation.activate_window(self.window_id):
-                time.sleep(5.0)  # 增加窗口激活等待时间
+            if self._activate_window(self.window_id):
+                self._sleep(5.0)  # 增加窗口激活等待时间
                 window_activated = True
                 print(f"窗口激活成功 (尝试 {attempt + 1}/3)")
                 break
             print(f"窗口激活重试中... (尝试 {attempt + 1}/3)")
-            time.sleep(2.0)  # 增加重试间隔
+            self._sleep(2.0)  # 增加重试间隔
             
         if not window_activated:
             print("Error: Failed to activate window")
@@ -292,22 +417,22 @@ class GrokAPI:
         # 使用更长的超时时间和更高的置信度来定位输入框
         input_pos = None
         # 先等待页面完全加载
-        time.sleep(5.0)  # 增加初始等待时间
+        self._sleep(5.0)  # 增加初始等待时间
         
         for attempt in range(3):  # 增加重试次数
             # 先检查页面是否已加载完成
             print(f"正在检查页面加载状态... (尝试 {attempt + 1}/3)")
             if not self._wait_for_template('input_field', 'input_field_alt', timeout=5.0, confidence=0.7):
                 print(f"等待页面加载... (尝试 {attempt + 1}/3)")
-                time.sleep(2.0)
+                self._sleep(2.0)
                 continue
             print("页面加载检查完成，开始定位输入框...")
             
             # 点击页面中心以确保窗口焦点
             screen = self._capture_screenshot()
             center_x, center_y = screen.shape[1] // 2, screen.shape[0] // 2
-            WindowsAutomation.run('click', center_x, center_y)
-            time.sleep(1.5)  # 增加等待时间
+            self._run('click', center_x, center_y)
+            self._sleep(1.5)  # 增加等待时间
             
             # 尝试定位输入框
             print(f"正在尝试定位输入框... (第 {attempt + 1} 次尝试)")
@@ -319,16 +444,16 @@ class GrokAPI:
             # 如果找不到输入框，尝试不同的焦点切换方法
             print(f"尝试切换焦点... (尝试 {attempt + 1}/3)")
             if attempt % 3 == 0:
-                WindowsAutomation.run('key', 'tab')
-                time.sleep(1.5)
+                self._run('key', 'tab')
+                self._sleep(1.5)
             elif attempt % 3 == 1:
-                WindowsAutomation.run('key', 'escape')
-                time.sleep(1.5)
+                self._run('key', 'escape')
+                self._sleep(1.5)
             else:
                 # 尝试点击页面不同区域
                 for offset in [(0, 50), (0, -50), (50, 0), (-50, 0)]:
-                    WindowsAutomation.run('click', center_x + offset[0], center_y + offset[1])
-                    time.sleep(1.0)
+                    self._run('click', center_x + offset[0], center_y + offset[1])
+                    self._sleep(1.0)
                 
         if not input_pos:
             print("Error: Could not locate input field")
@@ -340,23 +465,23 @@ class GrokAPI:
         for attempt in range(3):  # 重试次数改为3次
             # 移动到输入框位置并等待
             print(f"正在移动鼠标到输入框位置... (第 {attempt + 1} 次尝试)")
-            if WindowsAutomation.run('mousemove', input_pos[0], input_pos[1]):
+            if self._run('mousemove', input_pos[0], input_pos[1]):
                 print("鼠标移动成功")
             else:
                 print("鼠标移动失败，重试中...")
-            time.sleep(2.0)  # 增加等待时间
+            self._sleep(2.0)  # 增加等待时间
             
             print(f"尝试点击输入框... (尝试 {attempt + 1}/3)")
             # 单击并等待
-            if WindowsAutomation.run('click', input_pos[0], input_pos[1]):
+            if self._run('click', input_pos[0], input_pos[1]):
                 print("点击输入框成功")
             else:
                 print("点击输入框失败，重试中...")
-            time.sleep(3.0)  # 增加等待时间
+            self._sleep(3.0)  # 增加等待时间
             
             # 验证焦点是否真正获得
-            WindowsAutomation.run('key', 'ctrl', 'a')
-            time.sleep(1.5)  # 增加等待时间
+            self._run('key', 'ctrl', 'a')
+            self._sleep(1.5)  # 增加等待时间
             
             # 检查输入框状态，降低验证时的置信度阈值，增加调试信息
             print("正在验证输入框焦点状态...")
@@ -381,14 +506,14 @@ class GrokAPI:
             print(f"焦点获取失败，尝试其他方法... (尝试 {attempt + 1}/3)")
             # 如果失败，尝试不同的焦点获取方式
             if attempt % 2 == 0:
-                WindowsAutomation.run('key', 'tab')
-                time.sleep(1.5)
+                self._run('key', 'tab')
+                self._sleep(1.5)
             else:
                 # 点击页面中心后再次尝试
                 screen = self._capture_screenshot()
                 center_x, center_y = screen.shape[1] // 2, screen.shape[0] // 2
-                WindowsAutomation.run('click', center_x, center_y)
-                time.sleep(2.0)
+                self._run('click', center_x, center_y)
+                self._sleep(2.0)
                 
         if not focus_obtained:
             print("Error: Failed to obtain input field focus")
@@ -396,18 +521,18 @@ class GrokAPI:
         
         # 清空输入框
         for _ in range(2):  # 尝试两次清空操作
-            WindowsAutomation.run('key', 'ctrl', 'a')
-            time.sleep(0.5)
-            WindowsAutomation.run('key', 'Delete')
-            time.sleep(0.5)
+            self._run('key', 'ctrl', 'a')
+            self._sleep(0.5)
+            self._run('key', 'Delete')
+            self._sleep(0.5)
 
         # 处理匿名聊天模式
         if self.anonymous_chat:
-            WindowsAutomation.run('key', 'ctrl', 'shift', 'j')
-            time.sleep(2.0)  # 增加等待时间
+            self._run('key', 'ctrl', 'shift', 'j')
+            self._sleep(2.0)  # 增加等待时间
     
         # 保存并恢复剪贴板内容
-        original_clipboard = pyperclip.paste()
+        original_clipboard = self._clipboard_paste()
         
         try:
             # 输入消息
@@ -415,33 +540,33 @@ class GrokAPI:
                 # 多次尝试粘贴消息
                 for _ in range(3):  # 重试次数改为3次
                     # 确保输入框为空
-                    WindowsAutomation.run('key', 'ctrl', 'a')
-                    time.sleep(0.5)
-                    WindowsAutomation.run('key', 'delete')
-                    time.sleep(1.0)
+                    self._run('key', 'ctrl', 'a')
+                    self._sleep(0.5)
+                    self._run('key', 'delete')
+                    self._sleep(1.0)
                     
                     # 粘贴消息
-                    pyperclip.copy(message)
-                    time.sleep(1.0)  # 增加等待时间
-                    WindowsAutomation.run('key', 'ctrl', 'v')
-                    time.sleep(2.0)  # 增加等待时间
+                    self._clipboard_copy(message)
+                    self._sleep(1.0)  # 增加等待时间
+                    self._run('key', 'ctrl', 'v')
+                    self._sleep(2.0)  # 增加等待时间
                     
                     # 验证消息是否已粘贴
-                    WindowsAutomation.run('key', 'ctrl', 'a')
-                    time.sleep(1.0)
-                    current_text = pyperclip.paste()
+                    self._run('key', 'ctrl', 'a')
+                    self._sleep(1.0)
+                    current_text = self._clipboard_paste()
                     if current_text == message:
                         print("消息粘贴成功")
                         break
                     print("消息粘贴失败，重试中...")
-                    time.sleep(1.0)  # 重试前等待
+                    self._sleep(1.0)  # 重试前等待
 
             # 处理文件
             if file_paths:
                 for file_path in file_paths:
                     if self._copy_file(file_path):
-                        WindowsAutomation.run('key', 'ctrl', 'v')
-                        time.sleep(2.0)
+                        self._run('key', 'ctrl', 'v')
+                        self._sleep(2.0)
 
             # 尝试发送消息
             print("尝试发送消息...")
@@ -449,62 +574,64 @@ class GrokAPI:
             # 确保输入框有焦点
             input_pos = self._find_template('input_field', 0.85)
             if input_pos:
-                WindowsAutomation.run('mousemove', input_pos[0], input_pos[1])
-                time.sleep(0.5)
-                WindowsAutomation.run('click', input_pos[0], input_pos[1])
-                time.sleep(1.0)
+                self._run('mousemove', input_pos[0], input_pos[1])
+                self._sleep(0.5)
+                self._run('click', input_pos[0], input_pos[1])
+                self._sleep(1.0)
             
             # 清空输入框
-            WindowsAutomation.run('key', 'ctrl', 'a')
-            time.sleep(0.5)
-            WindowsAutomation.run('key', 'delete')
-            time.sleep(0.5)
+            self._run('key', 'ctrl', 'a')
+            self._sleep(0.5)
+            self._run('key', 'delete')
+            self._sleep(0.5)
             
             # 使用pyautogui.typewrite输入消息和发送
             print("直接输入消息和发送...")
-            pyautogui.typewrite(message + '\n')  # 直接在消息后面加上回车
-            time.sleep(2.0)  # 增加等待时间
+            self._run('type', message + '\n')  # 直接在消息后面加上回车
+            self._sleep(2.0)  # 增加等待时间
             
             # 再发送一次回车以确保
             print("再次发送回车...")
-            pyautogui.typewrite(['\n'])
-            time.sleep(2.0)
+            self._run('type', ['\n'])
+            self._sleep(2.0)
             
             # 等待一段时间让消息发送
             print("等待消息发送完成...")
-            time.sleep(5.0)
+            self._sleep(5.0)
             
             # 假定消息已发送成功
             print("消息已发送！")
             return True
         finally:
             # 确保在任何情况下都恢复原始剪贴板内容
-            pyperclip.copy(original_clipboard)
+            self._clipboard_copy(original_clipboard)
 
 
 
     def get_response(self, timeout=60):
         """Retrieve the response from the UI."""
-        start_time = time.time()
-        original_clipboard = pyperclip.paste()
+        if self.recorder:
+            self.recorder.record_call('get_response', timeout=timeout, window_id=self.window_id)
+        start_time = self._clock()
+        original_clipboard = self._clipboard_paste()
         
         print("\n[获取响应] 开始等待响应...")
         
         # Make sure the window is active
         if self.window_id:
-            WindowsAutomation.activate_window(self.window_id)
-            time.sleep(0.1)  # Give time for activation
+            self._activate_window(self.window_id)
+            self._sleep(0.1)  # Give time for activation
         
         # 等待页面加载完成
         print("[获取响应] 等待页面加载...")
-        time.sleep(10.0)  # 增加初始等待时间
+        self._sleep(10.0)  # 增加初始等待时间
         
-        while time.time() - start_time < timeout:
-            print(f"\r[获取响应] 等待中... 已等待 {int(time.time() - start_time)} 秒", end="")
+        while self._clock() - start_time < timeout:
+            print(f"\r[获取响应] 等待中... 已等待 {int(self._clock() - start_time)} 秒", end="")
             
             # 滚动到页面底部
-            WindowsAutomation.run('key', 'end')
-            time.sleep(2.0)  # 增加滚动后等待时间
+            self._run('key', 'end')
+            self._sleep(2.0)  # 增加滚动后等待时间
             
             # 先尝试找到复制按钮
             copy_button_pos = None
@@ -519,21 +646,21 @@ class GrokAPI:
             
             if copy_button_pos:
                 # 移动到按钮位置并点击
-                WindowsAutomation.run('mousemove', copy_button_pos[0], copy_button_pos[1])
-                time.sleep(1.0)
-                WindowsAutomation.run('click', copy_button_pos[0], copy_button_pos[1])
-                time.sleep(2.0)  # 增加点击后等待时间
+                self._run('mousemove', copy_button_pos[0], copy_button_pos[1])
+                self._sleep(1.0)
+                self._run('click', copy_button_pos[0], copy_button_pos[1])
+                self._sleep(2.0)  # 增加点击后等待时间
                 
                 # 检查剪贴板内容
-                response = pyperclip.paste()
+                response = self._clipboard_paste()
                 if response != original_clipboard and response.strip():
                     print("\n[获取响应] 成功获取响应内容")
                     return response
             
             # 如果找不到复制按钮或复制失败，继续尝试
-            time.sleep(2.0)  # 增加重试间隔
-            WindowsAutomation.run('key', 'page_down')
-            time.sleep(2.0)
+            self._sleep(2.0)  # 增加重试间隔
+            self._run('key', 'page_down')
+            self._sleep(2.0)
         
         print("\n[获取响应] 超时等待响应")
         return "Error: Timeout waiting for response"
@@ -550,95 +677,389 @@ class GrokAPI:
         response = self.get_response(timeout)
         # Окно закрывается только если reuse_window=False и close_after=True
         if not self.reuse_window and close_after and (wid := self._load_window_id()):
-            WindowsAutomation.activate_window(wid)
-            WindowsAutomation.run('key', 'ctrl', 'F4')
+            self._activate_window(wid)
+            self._run('key', 'ctrl', 'F4')
             os.remove(WINDOW_ID_FILE) if os.path.exists(WINDOW_ID_FILE) else None
         return response
 
+class ReplayAutomation(Automation):
+    """No-op backend for replays: nothing touches real input devices, windows or the clipboard.
+
+    ReplayGrokAPI serves recorded results itself; this only keeps any other
+    path that reaches the backend harmless and deterministic.
+    """
+
+    def __init__(self):
+        self.clipboard = ""
+
+    def run(self, action, *args):
+        return True
+
+    def get_active_window(self):
+        return None
+
+    def activate_window(self, window_id):
+        return True
+
+    def is_window(self, window_id):
+        return True
+
+    def get_window_rect(self, window_id):
+        return (0, 0, 0, 0)
+
+    def clipboard_copy(self, text):
+        self.clipboard = text
+
+    def clipboard_paste(self):
+        return self.clipboard
+
+    def clipboard_copy_image(self, file_path):
+        return False
+
+class ReplayGrokAPI(GrokAPI):
+    """Replay a recorded session trace through send_message / get_response without a display.
+
+    Frames, action results and clipboard reads are served from the trace in the
+    order they were recorded, and sleeps advance a virtual clock instead of
+    blocking, so timing and template matching changes can be checked against
+    real sessions in seconds.
+    """
+
+    def __init__(self, trace_path, **kwargs):
+        # 回放不接触真实的输入设备和窗口
+        kwargs.setdefault('automation', ReplayAutomation())
+        super().__init__(**kwargs)
+        self.calls = []
+        self._frames = deque()
+        self._actions = deque()
+        self._pastes = deque()
+        self._file_copies = deque()
+        self._prev_frame = None
+        # 帧保持压缩状态，取用时才解码，长会话也不会占满内存
+        for e in read_trace(trace_path, decode_frames=False):
+            if e['kind'] == 'call':
+                self.calls.append(e)
+            elif not self.calls:
+                # 旧分段被轮换掉时，第一个保留的调用之前的记录属于被丢弃的调用，
+                # 只用其中的帧作为后续差分帧的基准
+                if e['kind'] == 'frame':
+                    self._prev_frame = decode_frame(e, self._prev_frame)
+            elif e['kind'] == 'frame':
+                self._frames.append(e)
+            elif e['kind'] == 'action':
+                self._actions.append(e)
+            elif e['kind'] == 'clipboard' and e['op'] == 'paste':
+                self._pastes.append(e['text'])
+            elif e['kind'] == 'clipboard' and e['op'] == 'copy_file':
+                self._file_copies.append(e['result'])
+        self._last_frame = np.zeros((1, 1, 4), dtype=np.uint8)
+        self._clipboard = ""
+        self.virtual_time = 0.0
+        self.stats = {'frames': 0, 'actions': 0, 'action_mismatches': 0}
+
+    def _sleep(self, seconds):
+        self.virtual_time += seconds
+
+    def _clock(self):
+        return self.virtual_time
+
+    def _next_action(self, action, args):
+        self.stats['actions'] += 1
+        if not self._actions:
+            self.stats['action_mismatches'] += 1
+            return True
+        recorded = self._actions.popleft()
+        if recorded['action'] != action or recorded['args'] != list(args):
+            self.stats['action_mismatches'] += 1
+        return recorded['result']
+
+    def _run(self, action, *args):
+        result = self._next_action(action, args)
+        if self.recorder:
+            self.recorder.record_action(action, args, result)
+        return result
+
+    def _activate_window(self, hwnd):
+        result = self._next_action('activate', (hwnd,))
+        if self.recorder:
+            self.recorder.record_action('activate', (hwnd,), result)
+        return result
+
+    def _clipboard_copy(self, text):
+        self._clipboard = text
+        if self.recorder:
+            self.recorder.record_clipboard('copy', text)
+
+    def _clipboard_paste(self):
+        text = self._pastes.popleft() if self._pastes else self._clipboard
+        if self.recorder:
+            self.recorder.record_clipboard('paste', text)
+        return text
+
+    def _grab_screenshot(self):
+        # 帧用完后保持最后一帧，模拟静止的窗口
+        if self._frames:
+            self._last_frame = self._prev_frame = decode_frame(self._frames.popleft(), self._prev_frame)
+            self.stats['frames'] += 1
+        return self._last_frame
+
+    def _copy_file_to_clipboard(self, file_path):
+        return self._file_copies.popleft() if self._file_copies else False
+
+    def replay(self):
+        """Repeat the recorded calls and return the last response."""
+        response = None
+        for call in self.calls:
+            kwargs = dict(call['kwargs'])
+            self.window_id = kwargs.pop('window_id', None) or self.window_id
+            if call['method'] == 'send_message':
+                if not self.send_message(**kwargs):
+                    response = "Error: Failed to send message"
+            elif call['method'] == 'get_response':
+                response = self.get_response(**kwargs)
+        print(f"[回放] 虚拟耗时 {self.virtual_time:.1f} 秒, 统计: {self.stats}")
+        return response
+
 def check_dependencies():
-    def check_command(cmd):
+    if sys.platform == "win32":
+        # 检查 PyAutoGUI 和 pywin32
         try:
-            # 检查常见的 ImageMagick 安装路径
-            if cmd == 'magick':
-                common_paths = [
-                    r"C:\Program Files\ImageMagick-7.1.1-Q16",
-                    r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI",
-                    r"C:\Program Files (x86)\ImageMagick-7.1.1-Q16",
-                    r"C:\Program Files (x86)\ImageMagick-7.1.1-Q16-HDRI",
-                    # 添加更多可能的版本
-                    r"C:\Program Files\ImageMagick*",
-                    r"C:\Program Files (x86)\ImageMagick*"
-                ]
-                
-                # 使用通配符查找实际安装路径
-                for pattern in common_paths:
-                    if '*' in pattern:
-                        import glob
-                        paths = glob.glob(pattern)
-                        for path in paths:
-                            magick_exe = os.path.join(path, "magick.exe")
-                            if os.path.exists(magick_exe):
-                                os.environ["PATH"] = path + os.pathsep + os.environ["PATH"]
-                                return True
-                    else:
-                        magick_exe = os.path.join(pattern, "magick.exe")
-                        if os.path.exists(magick_exe):
-                            os.environ["PATH"] = pattern + os.pathsep + os.environ["PATH"]
-                            return True
-                return False
-
-            # 对其他命令使用 where
-            result = subprocess.run(['where', cmd], capture_output=True, text=True)
-            return result.returncode == 0
-        except FileNotFoundError:
+            import pyautogui
+            import win32gui
+        except ImportError:
+            print("请安装 PyAutoGUI 和 pywin32: pip install pyautogui pywin32")
             return False
 
-    # 检查 ImageMagick 的 convert 命令
-    if not check_command('magick'):
-        print("请安装 ImageMagick")
-        return False
+        # 检查 pyperclip
+        try:
+            import pyperclip
+        except ImportError:
+            print("请安装 pyperclip: pip install pyperclip")
+            return False
+        return True
 
-    # 检查 PyAutoGUI (替代 xdotool)
+    # Linux: 通过 XTEST/EWMH 直接与 X 服务器通信，不再需要 xdotool、xclip 和 ImageMagick
     try:
-        import pyautogui
+        from Xlib import display
     except ImportError:
-        print("请安装 PyAutoGUI: pip install pyautogui")
+        print("请安装 python-xlib: pip install python-xlib")
         return False
-
-    # 检查 pyperclip (替代 xclip)
     try:
-        import pyperclip
-    except ImportError:
-        print("请安装 pyperclip: pip install pyperclip")
+        d = display.Display()
+    except Exception as e:
+        print(f"无法连接到 X 服务器 (DISPLAY={os.environ.get('DISPLAY')}): {str(e)}")
+        return False
+    has_xtest = d.has_extension('XTEST')
+    d.close()
+    if not has_xtest:
+        print("X 服务器不支持 XTEST 扩展")
         return False
-
     return True
 
+def _prompt_key(message, file_paths):
+    """Cache key for a prompt: hash of the message and the contents of its files."""
+    digest = hashlib.sha256(message.encode('utf-8'))
+    for path in file_paths or []:
+        digest.update(b"\0" + os.path.abspath(path).encode('utf-8') + b"\0")
+        try:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+def _read_jsonl(path):
+    """Read JSON object lines, skipping lines a crash may have left half-written."""
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f"[批处理] 警告: 跳过 {path} 第 {line_no} 行无法解析的记录")
+                    continue
+                if isinstance(entry, dict):
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+def _parse_batch_item(line, line_no):
+    """Return ``(prompt_id, message, file_paths, error)`` for one input line."""
+    try:
+        item = json.loads(line)
+    except ValueError:
+        item = line.rstrip("\n")
+    if not isinstance(item, dict):
+        item = {'message': str(item)}
+    # 隐式 ID 加前缀，避免与显式的 "id" 冲突
+    prompt_id = str(item['id']) if item.get('id') is not None else f"line:{line_no}"
+    message = item.get('message', "")
+    file_paths = item.get('files')
+    if not isinstance(message, str):
+        return prompt_id, None, None, "Invalid input: 'message' must be a string"
+    if file_paths is not None and not (isinstance(file_paths, list) and all(isinstance(p, str) for p in file_paths)):
+        return prompt_id, None, None, "Invalid input: 'files' must be a list of strings"
+    return prompt_id, message, file_paths or None, None
+
+def run_batch(api, lines, output_path, checkpoint_path=None, cache_path=None, timeout=60):
+    """Process JSONL prompts through one long-lived API instance.
+
+    Each input line is either a JSON object ``{"id": ..., "message": ..., "files": [...]}``
+    or a plain-text message; lines without an ``id`` get ``line:<n>``. Results are
+    appended to ``output_path`` as they complete; IDs of finished prompts are appended
+    to ``checkpoint_path`` so an interrupted run resumes where it stopped, and answers
+    are reused from ``cache_path`` by prompt hash.
+
+    Every attempt writes one output record. Records with ``"final": false`` are failed
+    attempts that a resumed run retries, so an ID may appear several times; the record
+    with ``"final": true`` is the result. Invalid input lines get a final error record.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".ckpt"
+    done = {str(entry['id']) for entry in _read_jsonl(checkpoint_path) if 'id' in entry}
+    cache = {entry['key']: entry['response'] for entry in _read_jsonl(cache_path)
+             if 'key' in entry and isinstance(entry.get('response'), str)} if cache_path else {}
+    stats = {'done': 0, 'cached': 0, 'skipped': 0, 'failed': 0, 'invalid': 0}
+
+    def append(path, record):
+        with open(path, 'a+b') as f:
+            # 上次崩溃可能留下没有换行的半行，先补上换行以免新记录与其粘连
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+    browser_ready = False
+    try:
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            prompt_id, message, file_paths, error = _parse_batch_item(line, line_no)
+            if prompt_id in done:
+                stats['skipped'] += 1
+                continue
+            if error:
+                # 输入本身有误，重试也无济于事，记为最终结果
+                append(output_path, {'id': prompt_id, 'error': error, 'final': True})
+                append(checkpoint_path, {'id': prompt_id})
+                done.add(prompt_id)
+                stats['invalid'] += 1
+                continue
+
+            key = _prompt_key(message, file_paths)
+            record = {'id': prompt_id, 'message': message}
+            if key in cache:
+                record.update(response=cache[key], cached=True)
+                stats['cached'] += 1
+            else:
+                try:
+                    # 只在首次需要时打开浏览器，之后所有请求复用同一窗口
+                    if not browser_ready:
+                        browser_ready = bool(api._open_browser())
+                    if not browser_ready:
+                        response = "Error: Failed to open browser"
+                    elif not api.send_message(message, file_paths):
+                        response = "Error: Failed to send message"
+                    else:
+                        response = api.get_response(timeout)
+                except Exception as e:
+                    response = f"Error: {str(e)}"
+                if not isinstance(response, str) or response.startswith("Error:"):
+                    # 窗口可能已关闭或连接已断开，下一个请求重新打开浏览器
+                    browser_ready = False
+                    record.update(error=str(response), final=False)
+                    stats['failed'] += 1
+                    append(output_path, record)
+                    continue
+                record['response'] = response
+                stats['done'] += 1
+                if cache_path:
+                    cache[key] = response
+                    append(cache_path, {'key': key, 'response': response})
+            record['final'] = True
+            append(output_path, record)
+            append(checkpoint_path, {'id': prompt_id})
+            done.add(prompt_id)
+    except KeyboardInterrupt:
+        print(f"\n[批处理] 已中断，重新运行相同命令即可从 {checkpoint_path} 继续")
+    print(f"[批处理] 完成: {stats}")
+    return stats
+
 if __name__ == "__main__":
     import sys
     args = sys.argv[1:]
     reuse_window = any(x in args for x in ["--reuse-window", "-rw"])
     anonymous_chat = any(x in args for x in ["--anonymous-chat", "-ac"])
     close_after = not any(x in args for x in ["--no-close", "-nc"])
-
-    if not check_dependencies():
-        print("Error: Missing dependencies (pyautogui, pyperclip, imagemagick)")
-        sys.exit(1)
+    use_cdp = "--cdp" in args
 
     message = ""
     file_paths = []
-    for arg in args:
-        if arg.startswith("-"):
+    trace_path = None
+    replay_path = None
+    batch_path = None
+    output_path = "batch_output.jsonl"
+    checkpoint_path = None
+    cache_path = None
+    arg_iter = iter(args)
+    for arg in arg_iter:
+        if arg in ("--trace", "-tr"):
+            trace_path = next(arg_iter, None)
+        elif arg in ("--batch", "-b"):
+            batch_path = next(arg_iter, None)
+        elif arg in ("--output", "-o"):
+            output_path = next(arg_iter, output_path)
+        elif arg == "--checkpoint":
+            checkpoint_path = next(arg_iter, None)
+        elif arg == "--cache":
+            cache_path = next(arg_iter, None)
+        elif arg == "--replay":
+            replay_path = next(arg_iter, None)
+        elif arg.startswith("-"):
             continue
         elif os.path.exists(arg):
             file_paths.append(os.path.abspath(arg))
         elif not message:
             message = arg
 
-    api = GrokAPI(reuse_window=reuse_window, anonymous_chat=anonymous_chat)
-    if message or file_paths:
-        response = api.ask(message, file_paths, close_after=close_after)
-        print(response)
+    if replay_path:
+        print(ReplayGrokAPI(replay_path).replay())
+        sys.exit(0)
+
+    if use_cdp:
+        # DevTools 后端不依赖截图、鼠标和剪贴板
+        from grok_cdp import CDPGrokAPI
+        api = CDPGrokAPI(reuse_window=reuse_window, anonymous_chat=anonymous_chat)
     else:
-        print("Usage: python grok_api.py [options] \"message\" [files...]")
-        print("Options: --reuse-window/-rw, --anonymous-chat/-ac, --no-close/-nc")
\ No newline at end of file
+        if not check_dependencies():
+            print("Error: Missing dependencies (pyautogui, pywin32, pyperclip on Windows; python-xlib and an X display on Linux)")
+            sys.exit(1)
+        api = GrokAPI(reuse_window=reuse_window, anonymous_chat=anonymous_chat, trace_path=trace_path)
+
+    try:
+        if batch_path:
+            if batch_path == "-":
+                run_batch(api, sys.stdin, output_path, checkpoint_path, cache_path)
+            else:
+                with open(batch_path, 'r', encoding='utf-8') as f:
+                    run_batch(api, f, output_path, checkpoint_path, cache_path)
+        elif message or file_paths:
+            response = api.ask(message, file_paths, close_after=close_after)
+            print(response)
+        else:
+            print("Usage: python grok_api.py [options] \"message\" [files...]")
+            print("       python grok_api.py [options] --batch prompts.jsonl|- [--output out.jsonl] [--checkpoint file] [--cache file]")
+            print("       python grok_api.py --replay trace.bin")
+            print("Options: --reuse-window/-rw, --anonymous-chat/-ac, --no-close/-nc, --trace/-tr trace.bin, --cdp")
+    finally:
+        # 出错时也要把会话记录写入磁盘，这正是需要复现的情况
+        if use_cdp:
+            api.close()
+        else:
+            api.close_trace()
\ No newline at end of file
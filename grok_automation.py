@@ -0,0 +1,51 @@
+from abc import ABC, abstractmethod
+
+
+class Automation(ABC):
+    """Input, window and clipboard backend used by GrokAPI.
+
+    ``run`` performs one input action and returns True on success:
+    ``('click', x, y)``, ``('mousemove', x, y)``, ``('key', *keys)`` for a
+    single key or a chord, and ``('type', text_or_key_list)``. Key names follow
+    pyautogui (``'ctrl'``, ``'enter'``, ``'page_down'``, ``'F4'``...). Window
+    handles are plain integers so they can be persisted in WINDOW_ID_FILE.
+    """
+
+    @abstractmethod
+    def run(self, action, *args):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_active_window(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def activate_window(self, window_id):
+        raise NotImplementedError
+
+    def find_window(self, title):
+        """Return the most recently mapped window whose title contains ``title``, or None."""
+        return None
+
+    @abstractmethod
+    def is_window(self, window_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_window_rect(self, window_id):
+        """Return ``(left, top, right, bottom)`` of the window in screen coordinates."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clipboard_copy(self, text):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clipboard_paste(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clipboard_copy_image(self, file_path):
+        """Put an image file on the clipboard; return True on success."""
+        raise NotImplementedError
+
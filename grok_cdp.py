@@ -0,0 +1,320 @@
+import json
+import os
+import subprocess
+import time
+import urllib.request
+
+import websocket
+
+DEBUG_HOST = "127.0.0.1"
+DEBUG_PORT = 9222
+
+# 默认选择器，页面改版时可通过参数覆盖
+INPUT_SELECTOR = 'textarea, div[contenteditable="true"]'
+RESPONSE_SELECTOR = '.message-bubble'
+FILE_INPUT_SELECTOR = 'input[type="file"]'
+BUSY_SELECTOR = 'button[aria-label="Stop"], button[aria-label="停止"]'
+
+BINDING_NAME = "__grokCdpNotify"
+
+BROWSERS = {
+    "chrome": r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    "edge": r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe",
+}
+
+# 注入页面的观察脚本：响应区域每次变化时通过绑定推送最后一条消息的文本
+OBSERVER_SCRIPT = """
+(() => {
+    if (window.__grokCdpObserver) { window.__grokCdpObserver.notify(); return; }
+    const selector = %(response)s, busy = %(busy)s;
+    let pending = false;
+    const notify = () => {
+        if (pending) return;
+        pending = true;
+        setTimeout(() => {
+            pending = false;
+            const nodes = document.querySelectorAll(selector);
+            const last = nodes[nodes.length - 1];
+            window.%(binding)s(JSON.stringify({
+                count: nodes.length,
+                text: last ? last.innerText : "",
+                busy: !!document.querySelector(busy),
+            }));
+        }, 50);
+    };
+    const observer = new MutationObserver(notify);
+    const start = () => observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    document.documentElement ? start() : document.addEventListener("DOMContentLoaded", start);
+    window.__grokCdpObserver = {notify};
+    notify();
+})();
+"""
+
+
+class CDPError(Exception):
+    """Raised when the DevTools endpoint returns an error or cannot be reached."""
+
+
+class CDPGrokAPI:
+    """Grok client that drives the browser over the Chrome DevTools Protocol.
+
+    Exposes the same ``ask`` / ``send_message`` / ``get_response`` API as
+    ``GrokAPI`` but never touches the screen, mouse or system clipboard: the
+    prompt is inserted into the input element directly, and response text is
+    pushed back from a MutationObserver through a Runtime binding.
+    """
+
+    def __init__(self, url="https://grok.com", reuse_window=False, anonymous_chat=False,
+                 debug_host=DEBUG_HOST, debug_port=DEBUG_PORT, launch_browser=True,
+                 input_selector=INPUT_SELECTOR, response_selector=RESPONSE_SELECTOR,
+                 busy_selector=BUSY_SELECTOR, settle_time=2.0, on_delta=None):
+        self.url = url
+        self.reuse_window = reuse_window
+        self.anonymous_chat = anonymous_chat
+        self.debug_host = debug_host
+        self.debug_port = debug_port
+        self.launch_browser = launch_browser
+        self.input_selector = input_selector
+        self.response_selector = response_selector
+        self.busy_selector = busy_selector
+        self.settle_time = settle_time
+        self.on_delta = on_delta
+        self.window_id = None
+        self._ws = None
+        self._next_id = 0
+        self._state = {"count": 0, "text": "", "busy": False}
+        self._baseline = None
+        self._sent_message = ""
+        self._streamed = ""
+
+    # --- DevTools HTTP endpoint ---
+
+    def _http(self, path, method="GET"):
+        request = urllib.request.Request(f"http://{self.debug_host}:{self.debug_port}{path}", method=method)
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            body = resp.read().decode("utf-8")
+        try:
+            return json.loads(body)
+        except ValueError:
+            return body
+
+    def _list_pages(self):
+        try:
+            return [t for t in self._http("/json/list") if t.get("type") == "page"]
+        except OSError:
+            return None
+
+    def _launch(self):
+        for name, path in BROWSERS.items():
+            if os.path.exists(path):
+                subprocess.Popen([path, f"--remote-debugging-port={self.debug_port}", "--new-window", self.url])
+                for _ in range(20):
+                    time.sleep(0.25)
+                    if self._list_pages() is not None:
+                        return True
+                print(f"Error: {name} did not expose a DevTools endpoint")
+                return False
+        return False
+
+    def _open_browser(self):
+        """Attach to (or open) a Grok tab and return its target ID."""
+        if self._ws is not None and self._ws.connected:
+            return self.window_id
+        self.close()
+        pages = self._list_pages()
+        if pages is None and self.launch_browser and self._launch():
+            pages = self._list_pages()
+        if pages is None:
+            print(f"Error: No DevTools endpoint at {self.debug_host}:{self.debug_port}")
+            return None
+
+        target = None
+        if self.reuse_window:
+            target = next((p for p in pages if p.get("url", "").startswith(self.url)), None)
+        if target is None:
+            try:
+                target = self._http(f"/json/new?{self.url}", method="PUT")
+            except OSError as e:
+                print(f"Error opening tab: {str(e)}")
+                return None
+
+        script = OBSERVER_SCRIPT % {
+            "response": json.dumps(self.response_selector),
+            "busy": json.dumps(self.busy_selector),
+            "binding": BINDING_NAME,
+        }
+        try:
+            self._ws = websocket.create_connection(target["webSocketDebuggerUrl"], timeout=10, suppress_origin=True)
+            self._call("Runtime.enable")
+            self._call("Page.enable")
+            self._call("Runtime.addBinding", name=BINDING_NAME)
+            self._call("Page.addScriptToEvaluateOnNewDocument", source=script)
+            self._call("Runtime.evaluate", expression=script)
+        except (CDPError, websocket.WebSocketException, OSError) as e:
+            print(f"Error connecting to DevTools: {str(e)}")
+            self.close()
+            return None
+        self.window_id = target["id"]
+        return self.window_id
+
+    def close(self):
+        """Close the WebSocket connection (the tab stays open)."""
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except (websocket.WebSocketException, OSError):
+                pass
+            self._ws = None
+
+    # --- WebSocket protocol ---
+
+    def _recv(self, timeout):
+        """Receive one message, or None on timeout; binding events update the observed state."""
+        self._ws.settimeout(max(timeout, 0.01))
+        try:
+            message = json.loads(self._ws.recv())
+        except websocket.WebSocketTimeoutException:
+            return None
+        if message.get("method") == "Runtime.bindingCalled" and message["params"].get("name") == BINDING_NAME:
+            self._update_state(json.loads(message["params"]["payload"]))
+        return message
+
+    def _call(self, method, timeout=30.0, **params):
+        self._next_id += 1
+        call_id = self._next_id
+        self._ws.settimeout(timeout)
+        self._ws.send(json.dumps({"id": call_id, "method": method, "params": params}))
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            message = self._recv(deadline - time.time())
+            if message is None or message.get("id") != call_id:
+                continue
+            if "error" in message:
+                raise CDPError(f"{method}: {message['error'].get('message')}")
+            return message.get("result", {})
+        raise CDPError(f"{method}: timed out")
+
+    def _evaluate(self, expression):
+        result = self._call("Runtime.evaluate", expression=expression, returnByValue=True, awaitPromise=True)
+        if "exceptionDetails" in result:
+            raise CDPError(result["exceptionDetails"].get("text", "evaluation failed"))
+        return result.get("result", {}).get("value")
+
+    def _update_state(self, state):
+        state["updated"] = time.time()
+        self._state = state
+        text = state.get("text", "")
+        if self._baseline is None or state.get("count", 0) <= self._baseline or text.strip() == self._sent_message.strip():
+            return
+        # 流式输出：只推送新增的部分，元素被替换时重新推送全文
+        delta = text[len(self._streamed):] if text.startswith(self._streamed) else text
+        self._streamed = text
+        if delta and self.on_delta:
+            self.on_delta(delta)
+
+    def _key(self, key, code, key_code, modifiers=0, text=None):
+        for event_type in ("keyDown", "keyUp"):
+            params = {"type": event_type, "key": key, "code": code,
+                      "windowsVirtualKeyCode": key_code, "modifiers": modifiers}
+            if text and event_type == "keyDown":
+                params["text"] = text
+            self._call("Input.dispatchKeyEvent", **params)
+
+    def _wait_for_input(self, timeout=15.0):
+        selector = json.dumps(self.input_selector)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._evaluate(f"!!document.querySelector({selector})"):
+                return True
+            self._recv(0.25)
+        return False
+
+    # --- public API ---
+
+    def send_message(self, message="", file_paths=None):
+        """Insert the message (and files) into the input element and submit it."""
+        if self._ws is None:
+            print("Error: No DevTools connection available")
+            return False
+        try:
+            if not self._wait_for_input():
+                print("Error: Could not locate input field")
+                return False
+
+            if self.anonymous_chat:
+                self._key("J", "KeyJ", 74, modifiers=2 | 8)  # Ctrl+Shift+J
+                self._wait_for_input()
+
+            self._evaluate(f"""(() => {{
+                const el = document.querySelector({json.dumps(self.input_selector)});
+                el.focus();
+                if ('value' in el) {{ el.select(); }} else {{ document.execCommand('selectAll'); }}
+            }})()""")
+            if message:
+                self._call("Input.insertText", text=message)
+
+            if file_paths:
+                document = self._call("DOM.getDocument")
+                node = self._call("DOM.querySelector", nodeId=document["root"]["nodeId"], selector=FILE_INPUT_SELECTOR)
+                if node.get("nodeId"):
+                    self._call("DOM.setFileInputFiles", nodeId=node["nodeId"],
+                               files=[os.path.abspath(p) for p in file_paths])
+                else:
+                    print("Warning: File input not found, files were not attached")
+
+            self._evaluate("window.__grokCdpObserver && window.__grokCdpObserver.notify()")
+            self._recv(0.2)
+            self._baseline = self._state.get("count", 0)
+            self._sent_message = message
+            self._streamed = ""
+            self._key("Enter", "Enter", 13, text="\r")
+            print("消息已发送！")
+            return True
+        except CDPError as e:
+            print(f"Error sending message: {str(e)}")
+            return False
+        except (websocket.WebSocketException, OSError) as e:
+            # 连接已断开，丢弃套接字，下次 ask 时重新连接
+            print(f"Error sending message: {str(e)}")
+            self.close()
+            return False
+
+    def get_response(self, timeout=60):
+        """Wait until the newest response stops changing and return its text."""
+        if self._ws is None:
+            return "Error: No DevTools connection available"
+        start_time = time.time()
+        baseline = self._baseline if self._baseline is not None else self._state.get("count", 0)
+        try:
+            while time.time() - start_time < timeout:
+                self._recv(min(self.settle_time, timeout - (time.time() - start_time)))
+                state = self._state
+                text = state.get("text", "").strip()
+                if (state.get("count", 0) > baseline and text and text != self._sent_message.strip()
+                        and not state.get("busy")
+                        and time.time() - state.get("updated", 0) >= self.settle_time):
+                    self._baseline = None
+                    return state["text"]
+        except CDPError as e:
+            return f"Error: {str(e)}"
+        except (websocket.WebSocketException, OSError) as e:
+            self.close()
+            return f"Error: {str(e)}"
+        return "Error: Timeout waiting for response"
+
+    def ask(self, message="", file_paths=None, timeout=60, close_after=True):
+        """Send a request and get a response."""
+        if not self._open_browser():
+            return "Error: Failed to open browser"
+        if not self.send_message(message, file_paths):
+            return "Error: Failed to send message"
+        response = self.get_response(timeout)
+        if not self.reuse_window and close_after:
+            target_id = self.window_id
+            self.close()
+            try:
+                self._http(f"/json/close/{target_id}")
+            except OSError:
+                pass
+            self.window_id = None
+        return response
@@ -0,0 +1,94 @@
+import hashlib
+import math
+import re
+from collections import OrderedDict
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# CJK 字符按一个 token 计算，其余文本按单词和标点切分
+_CJK = r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+_PIECE_RE = re.compile(rf"{_CJK}|(?:(?!{_CJK})[^\W\d_])+|\d+|[^\w\s]|_")
+
+
+class TokenCounter:
+    """Count tokens per message, caching counts by content hash.
+
+    Uses ``tiktoken`` when it is installed; otherwise falls back to a heuristic
+    that counts each CJK character as one token and every four characters of
+    a Latin word or digit run as one token, which tracks BPE tokenisers far
+    better than ``str.split``. A conversation that grows by one message only
+    tokenises that message.
+    """
+
+    def __init__(self, encoding="cl100k_base", cache_size=4096):
+        self.encoder = tiktoken.get_encoding(encoding) if tiktoken else None
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _count(self, text):
+        if self.encoder:
+            return len(self.encoder.encode(text, disallowed_special=()))
+        return sum(math.ceil(len(m) / 4) if len(m) > 1 else 1 for m in _PIECE_RE.findall(text))
+
+    def count(self, text):
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        tokens = self._count(text)
+        self._cache[key] = tokens
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def truncate(self, text, max_tokens):
+        """Cut text down to at most ``max_tokens`` tokens."""
+        if self.encoder:
+            tokens = self.encoder.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoder.decode(tokens[:max_tokens])
+        used = 0
+        for m in _PIECE_RE.finditer(text):
+            piece = m.group()
+            used += math.ceil(len(piece) / 4) if len(piece) > 1 else 1
+            if used > max_tokens:
+                return text[:m.start()].rstrip()
+        return text
+
+
+OVERFLOW_MODES = ("trim", "reject")
+
+
+class ContextBudgetError(ValueError):
+    """Raised when a prompt cannot be made to fit the context budget."""
+
+
+def fit_to_budget(messages, counter, budget, mode="trim"):
+    """Return the ``(role, text)`` messages that fit ``budget`` tokens and their total.
+
+    In ``trim`` mode the oldest non-system messages are dropped until the prompt
+    fits; system messages and the latest message are always kept. In ``reject``
+    mode, or if the kept messages alone are too large, ``ContextBudgetError`` is
+    raised.
+    """
+    if mode not in OVERFLOW_MODES:
+        raise ValueError(f"Unknown overflow mode {mode!r}, expected one of {OVERFLOW_MODES}")
+    counts = [counter.count(f"{role}: {text}\n") for role, text in messages]
+    total = sum(counts)
+    if total <= budget:
+        return messages, total
+    if mode == "reject":
+        raise ContextBudgetError(f"Prompt is {total} tokens, context budget is {budget}")
+
+    keep = [True] * len(messages)
+    for i, (role, _) in enumerate(messages[:-1]):
+        if total <= budget:
+            break
+        if role != "system":
+            keep[i] = False
+            total -= counts[i]
+    if total > budget:
+        raise ContextBudgetError(f"Prompt is {total} tokens after trimming, context budget is {budget}")
+    return [m for m, k in zip(messages, keep) if k], total
@@ -0,0 +1,198 @@
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+TRACE_VERSION = 1
+TRACE_MAGIC = b"GRKTRACE"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SEGMENTS = 8
+KEYFRAME_INTERVAL = 50
+
+_HEADER = struct.Struct("<II")  # 记录头长度, 负载长度
+
+
+def _json_default(value):
+    """Serialize numpy scalars and other stray values found in action args."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class TraceRecorder:
+    """Record frames, automation actions and clipboard traffic of a GrokAPI session.
+
+    Each record is stored as a small JSON header followed by an optional binary
+    payload. Frames are XOR-ed against the previous frame and zlib-compressed, so
+    the mostly static browser window costs only a few bytes per capture.
+
+    The trace is written as numbered segment files (``<path>.000001``, ...) of at
+    most ``max_bytes / segments`` bytes each. Only the newest ``segments`` files
+    are kept, so the total size stays bounded while the end of the session, where
+    problems usually show up, is always preserved. Every segment starts with a
+    keyframe and can be decoded on its own.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, segments=DEFAULT_SEGMENTS,
+                 keyframe_interval=KEYFRAME_INTERVAL, level=1):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segments = max(segments, 1)
+        self.segment_bytes = max(max_bytes // self.segments, 1)
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.dropped_segments = 0
+        self._lock = threading.Lock()
+        self._prev_frame = None
+        self._frames_since_key = 0
+        self._start = time.monotonic()
+        self._started = time.time()
+        self._file = None
+        self._size = 0
+        self._base_size = 0
+        self._segment = 0
+        # 删除同名的旧记录，避免与本次会话的分段混在一起
+        for old in trace_segments(path):
+            os.remove(old)
+        with self._lock:
+            self._open_segment()
+
+    def _open_segment(self):
+        """Start a new segment file and drop the oldest ones beyond the limit. Caller holds the lock."""
+        if self._file is not None:
+            self._file.close()
+        self._segment += 1
+        self._file = open(f"{self.path}.{self._segment:06d}", "wb")
+        self._file.write(TRACE_MAGIC)
+        self._size = len(TRACE_MAGIC)
+        # 新分段的第一帧必须是关键帧
+        self._prev_frame = None
+        self._append({"kind": "meta", "version": TRACE_VERSION, "started": self._started,
+                      "segment": self._segment, "t": round(time.monotonic() - self._start, 6)})
+        self._base_size = self._size
+        stale = trace_segments(self.path)[:-self.segments]
+        for old in stale:
+            os.remove(old)
+        self.dropped_segments += len(stale)
+
+    def _append(self, header, payload=b""):
+        raw = json.dumps(header, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self._file.write(_HEADER.pack(len(raw), len(payload)))
+        self._file.write(raw)
+        self._file.write(payload)
+        self._size += _HEADER.size + len(raw) + len(payload)
+
+    def _write(self, header, payload=b"", rotate=True):
+        header.setdefault("t", round(time.monotonic() - self._start, 6))
+        raw = json.dumps(header, ensure_ascii=False, default=_json_default).encode("utf-8")
+        size = _HEADER.size + len(raw) + len(payload)
+        with self._lock:
+            if self._file is None:
+                return False
+            # 单条超大记录也至少能写进一个空分段
+            if self._size + size > self.segment_bytes and self._size > self._base_size:
+                if not rotate:
+                    return False
+                self._open_segment()
+            self._file.write(_HEADER.pack(len(raw), len(payload)))
+            self._file.write(raw)
+            self._file.write(payload)
+            self._size += size
+            return True
+
+    def record_frame(self, frame):
+        """Record a captured screenshot as a delta against the previous one."""
+        if frame is None:
+            return
+        frame = np.ascontiguousarray(frame)
+        prev = self._prev_frame
+        keyframe = (prev is None or prev.shape != frame.shape or prev.dtype != frame.dtype
+                    or self._frames_since_key >= self.keyframe_interval)
+        data = frame if keyframe else np.bitwise_xor(frame, prev)
+        header = {"kind": "frame", "key": keyframe, "shape": list(frame.shape), "dtype": str(frame.dtype)}
+        if not keyframe and not self._write(header, zlib.compress(data.tobytes(), self.level), rotate=False):
+            # 差分帧放不下时换到新分段，并以关键帧开头
+            keyframe = True
+            header["key"] = True
+            data = frame
+        if keyframe:
+            self._write(header, zlib.compress(data.tobytes(), self.level))
+        self._prev_frame = frame.copy()
+        self._frames_since_key = 0 if keyframe else self._frames_since_key + 1
+
+    def record_action(self, action, args, result):
+        """Record a WindowsAutomation action and its outcome."""
+        self._write({"kind": "action", "action": action, "args": list(args), "result": result})
+
+    def record_clipboard(self, op, text=None, result=None):
+        """Record a clipboard read ('paste'), write ('copy') or file copy ('copy_file')."""
+        self._write({"kind": "clipboard", "op": op, "text": text, "result": result})
+
+    def record_call(self, method, **kwargs):
+        """Record an entry into a public GrokAPI method so a replay can repeat it."""
+        self._write({"kind": "call", "method": method, "kwargs": kwargs})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def trace_segments(path):
+    """Return the segment files of a trace, oldest first."""
+    segments = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()]
+    return sorted(segments, key=lambda p: int(p.rsplit(".", 1)[1]))
+
+
+def read_trace(path, decode_frames=True):
+    """Yield the events of a trace (all kept segments, or a single file), oldest first.
+
+    Frames carry a full ``frame`` array. With ``decode_frames=False`` they keep the
+    compressed ``payload`` instead, to be passed to ``decode_frame`` one at a time,
+    so a long trace never has to fit in memory uncompressed.
+    """
+    prev = None
+    for segment in trace_segments(path) or [path]:
+        for event in _read_segment(segment):
+            if event["kind"] == "frame" and decode_frames:
+                event["frame"] = prev = decode_frame(event, prev)
+                del event["payload"]
+            yield event
+
+
+def decode_frame(event, prev):
+    """Decode a frame event read with ``decode_frames=False`` against the previous frame."""
+    data = np.frombuffer(zlib.decompress(event["payload"]), dtype=event["dtype"]).reshape(event["shape"])
+    # 每个分段都以关键帧开头，所以跨分段沿用上一帧是安全的
+    return data.copy() if event["key"] or prev is None else np.bitwise_xor(data, prev)
+
+
+def _read_segment(path):
+    with open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"Not a trace file: {path}")
+        while True:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                break
+            header_len, payload_len = _HEADER.unpack(head)
+            raw = f.read(header_len)
+            payload = f.read(payload_len)
+            if len(raw) < header_len or len(payload) < payload_len:
+                break  # 记录被中断，保留已读取的部分
+            event = json.loads(raw.decode("utf-8"))
+            if event["kind"] == "frame":
+                event["payload"] = payload
+            yield event
@@ -0,0 +1,340 @@
+import io
+import threading
+
+import Xlib.threaded  # noqa: F401  剪贴板线程与主线程共用连接
+from Xlib import X, XK, Xatom, display, error
+from Xlib.ext import xtest
+from Xlib.protocol import event
+from PIL import Image
+
+from grok_automation import Automation
+
+# pyautogui 风格的键名到 X keysym 名称
+KEY_NAMES = {
+    'ctrl': 'Control_L', 'ctrlleft': 'Control_L', 'ctrlright': 'Control_R',
+    'shift': 'Shift_L', 'shiftleft': 'Shift_L', 'shiftright': 'Shift_R',
+    'alt': 'Alt_L', 'altleft': 'Alt_L', 'altright': 'Alt_R',
+    'win': 'Super_L', 'super': 'Super_L',
+    'enter': 'Return', 'return': 'Return', '\n': 'Return', '\r': 'Return',
+    'tab': 'Tab', '\t': 'Tab', 'space': 'space', ' ': 'space',
+    'esc': 'Escape', 'escape': 'Escape',
+    'backspace': 'BackSpace', 'delete': 'Delete', 'del': 'Delete', 'insert': 'Insert',
+    'home': 'Home', 'end': 'End',
+    'pageup': 'Prior', 'page_up': 'Prior', 'pgup': 'Prior',
+    'pagedown': 'Next', 'page_down': 'Next', 'pgdn': 'Next',
+    'up': 'Up', 'down': 'Down', 'left': 'Left', 'right': 'Right',
+}
+
+# 大于该长度的剪贴板内容按 ICCCM INCR 协议分块传输
+INCR_CHUNK = 64 * 1024
+PASTE_TIMEOUT = 1.0
+
+
+class X11Automation(Automation):
+    """Native X11 backend: XTEST input, EWMH window control and an in-process clipboard.
+
+    Every action is a handful of requests on one persistent X connection with
+    a single round trip at the end, and no sleeps are added; callers that need
+    the page to react wait explicitly. The clipboard is owned by an unmapped
+    window served from a background thread, so copy and paste never spawn
+    xclip. Works against any X server with the XTEST extension, including Xvfb.
+    """
+
+    def __init__(self, display_name=None):
+        self.display = display.Display(display_name)
+        if not self.display.has_extension('XTEST'):
+            raise RuntimeError("X server does not support the XTEST extension")
+        self.root = self.display.screen().root
+        self._atoms = {}
+        self._scratch_keycodes = None
+        self._scratch_next = 0
+
+        # 剪贴板：隐藏窗口持有 CLIPBOARD 选择，后台线程响应其他程序的请求
+        self._lock = threading.Lock()
+        self._owner = self.root.create_window(0, 0, 1, 1, 0, X.CopyFromParent,
+                                              event_mask=X.PropertyChangeMask)
+        self._owned = None  # {target_atom: (type_atom, bytes)}
+        self._owned_text = None
+        self._incr_out = {}
+        self._incr_in = None
+        self._paste_done = threading.Event()
+        self._paste_result = ""
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve_clipboard, daemon=True)
+        self._thread.start()
+
+    def _atom(self, name):
+        if name not in self._atoms:
+            self._atoms[name] = self.display.intern_atom(name)
+        return self._atoms[name]
+
+    def _window(self, window_id):
+        return self.display.create_resource_object('window', int(window_id))
+
+    def close(self):
+        self._closed = True
+        # 发送一条消息唤醒阻塞在 next_event 的线程
+        wake = event.ClientMessage(window=self._owner, client_type=self._atom('_GROK_WAKE'), data=(32, [0] * 5))
+        self._owner.send_event(wake)
+        self.display.flush()
+        self._thread.join(timeout=1.0)
+        self.display.close()
+
+    # --- input ---
+
+    def _keysym(self, name):
+        name = KEY_NAMES.get(name.lower() if len(name) > 1 else name, name)
+        keysym = XK.string_to_keysym(name)
+        if keysym == X.NoSymbol and len(name) == 1:
+            code = ord(name)
+            keysym = code if code < 0x100 else 0x01000000 | code
+        if keysym == X.NoSymbol:
+            raise ValueError(f"Unknown key: {name!r}")
+        return keysym
+
+    def _keycode(self, keysym):
+        """Return (keycode, needs_shift), remapping a spare keycode for unmapped symbols."""
+        keycode = self.display.keysym_to_keycode(keysym)
+        if keycode:
+            return keycode, self.display.keycode_to_keysym(keycode, 0) != keysym
+        if self._scratch_keycodes is None:
+            first = self.display.display.info.min_keycode
+            count = self.display.display.info.max_keycode - first + 1
+            mapping = self.display.get_keyboard_mapping(first, count)
+            unused = [first + i for i, syms in enumerate(mapping) if not any(syms)]
+            self._scratch_keycodes = unused or [self.display.display.info.max_keycode]
+        # 轮流使用空闲键码，避免客户端还未处理完上一个按键时映射就被覆盖
+        keycode = self._scratch_keycodes[self._scratch_next % len(self._scratch_keycodes)]
+        self._scratch_next += 1
+        self.display.change_keyboard_mapping(keycode, [(keysym, keysym)])
+        self.display.sync()
+        return keycode, False
+
+    def _press(self, keysyms):
+        """Press a chord of keysyms in order and release them in reverse."""
+        pressed = []
+        for keysym in keysyms:
+            keycode, shift = self._keycode(keysym)
+            if shift:
+                shift_code, _ = self._keycode(XK.XK_Shift_L)
+                xtest.fake_input(self.display, X.KeyPress, shift_code)
+                pressed.append(shift_code)
+            xtest.fake_input(self.display, X.KeyPress, keycode)
+            pressed.append(keycode)
+        for keycode in reversed(pressed):
+            xtest.fake_input(self.display, X.KeyRelease, keycode)
+
+    def run(self, action, *args):
+        try:
+            if action == 'click':
+                xtest.fake_input(self.display, X.MotionNotify, x=int(args[0]), y=int(args[1]))
+                xtest.fake_input(self.display, X.ButtonPress, 1)
+                xtest.fake_input(self.display, X.ButtonRelease, 1)
+            elif action == 'mousemove':
+                xtest.fake_input(self.display, X.MotionNotify, x=int(args[0]), y=int(args[1]))
+            elif action == 'key':
+                self._press([self._keysym(k) for k in args])
+            elif action == 'type':
+                # 先解析全部按键，未知键名不会留下输入了一半的文本
+                for keysym in [self._keysym(key) for key in args[0]]:
+                    self._press([keysym])
+            else:
+                return False
+            self.display.sync()
+            return True
+        except (error.XError, ValueError) as e:
+            print(f"自动化操作失败: {str(e)}")
+            return False
+
+    # --- windows (EWMH) ---
+
+    def _get_property(self, window, name, prop_type=X.AnyPropertyType):
+        try:
+            prop = window.get_full_property(self._atom(name), prop_type)
+        except error.XError:
+            return None
+        return prop.value if prop else None
+
+    def _has_window_manager(self):
+        return bool(self._get_property(self.root, '_NET_SUPPORTING_WM_CHECK'))
+
+    def get_active_window(self):
+        active = self._get_property(self.root, '_NET_ACTIVE_WINDOW')
+        if active is not None and len(active) and active[0]:
+            return int(active[0])
+        focus = self.display.get_input_focus().focus
+        return focus.id if hasattr(focus, 'id') and focus.id != self.root.id else None
+
+    def activate_window(self, window_id):
+        try:
+            window = self._window(window_id)
+            if self._has_window_manager():
+                message = event.ClientMessage(window=window, client_type=self._atom('_NET_ACTIVE_WINDOW'),
+                                              data=(32, [2, X.CurrentTime, 0, 0, 0]))
+                self.root.send_event(message, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+            else:
+                # 没有窗口管理器（例如裸 Xvfb）时直接设置焦点
+                window.map()
+                window.configure(stack_mode=X.Above)
+                window.set_input_focus(X.RevertToParent, X.CurrentTime)
+            self.display.sync()
+            return True
+        except error.XError:
+            return False
+
+    def _window_title(self, window):
+        title = self._get_property(window, '_NET_WM_NAME', self._atom('UTF8_STRING'))
+        if title is None:
+            title = self._get_property(window, 'WM_NAME')
+        if isinstance(title, bytes):
+            title = title.decode('utf-8', errors='replace')
+        return title or ""
+
+    def find_window(self, title):
+        clients = self._get_property(self.root, '_NET_CLIENT_LIST_STACKING') \
+            or self._get_property(self.root, '_NET_CLIENT_LIST')
+        if clients is not None:
+            windows = [self._window(wid) for wid in clients]
+        else:
+            windows = self.root.query_tree().children
+        for window in reversed(windows):
+            if title.lower() in self._window_title(window).lower():
+                return window.id
+        return None
+
+    def is_window(self, window_id):
+        try:
+            self._window(window_id).get_attributes()
+            return True
+        except error.XError:
+            return False
+
+    def get_window_rect(self, window_id):
+        window = self._window(window_id)
+        geometry = window.get_geometry()
+        origin = self.root.translate_coords(window, 0, 0)
+        return origin.x, origin.y, origin.x + geometry.width, origin.y + geometry.height
+
+    # --- clipboard ---
+
+    def _own(self, targets, text=None):
+        with self._lock:
+            self._owned = targets
+            self._owned_text = text
+        self._owner.set_selection_owner(self._atom('CLIPBOARD'), X.CurrentTime)
+        self.display.sync()
+        return self.display.get_selection_owner(self._atom('CLIPBOARD')) == self._owner
+
+    def clipboard_copy(self, text):
+        data = text.encode('utf-8')
+        utf8 = self._atom('UTF8_STRING')
+        targets = {
+            utf8: (utf8, data),
+            self._atom('text/plain;charset=utf-8'): (utf8, data),
+            self._atom('TEXT'): (utf8, data),
+            Xatom.STRING: (Xatom.STRING, text.encode('latin-1', errors='replace')),
+        }
+        return self._own(targets, text)
+
+    def clipboard_copy_image(self, file_path):
+        try:
+            buffer = io.BytesIO()
+            Image.open(file_path).save(buffer, format='PNG')
+        except OSError:
+            return False
+        png = self._atom('image/png')
+        return self._own({png: (png, buffer.getvalue())})
+
+    def clipboard_paste(self):
+        with self._lock:
+            if self._owned is not None:
+                return self._owned_text or ""
+            self._paste_done.clear()
+            self._paste_result = ""
+        self._owner.convert_selection(self._atom('CLIPBOARD'), self._atom('UTF8_STRING'),
+                                      self._atom('_GROK_PASTE'), X.CurrentTime)
+        self.display.flush()
+        self._paste_done.wait(PASTE_TIMEOUT)
+        return self._paste_result
+
+    def _serve_clipboard(self):
+        while not self._closed:
+            try:
+                e = self.display.next_event()
+            except (error.ConnectionClosedError, OSError):
+                return
+            try:
+                if e.type == X.SelectionRequest:
+                    self._handle_selection_request(e)
+                elif e.type == X.SelectionClear:
+                    with self._lock:
+                        self._owned = self._owned_text = None
+                elif e.type == X.SelectionNotify:
+                    self._handle_selection_notify(e)
+                elif e.type == X.PropertyNotify:
+                    self._handle_property_notify(e)
+            except error.XError:
+                pass
+
+    def _handle_selection_request(self, e):
+        prop = e.property if e.property != X.NONE else e.target
+        requestor = e.requestor
+        with self._lock:
+            owned = self._owned
+        if owned is None or e.selection != self._atom('CLIPBOARD'):
+            prop = X.NONE
+        elif e.target == self._atom('TARGETS'):
+            requestor.change_property(prop, Xatom.ATOM, 32, [self._atom('TARGETS')] + list(owned))
+        elif e.target in owned:
+            type_atom, data = owned[e.target]
+            if len(data) > INCR_CHUNK:
+                requestor.change_attributes(event_mask=X.PropertyChangeMask)
+                requestor.change_property(prop, self._atom('INCR'), 32, [len(data)])
+                self._incr_out[(requestor.id, prop)] = (type_atom, data, 0)
+            else:
+                requestor.change_property(prop, type_atom, 8, data)
+        else:
+            prop = X.NONE
+        notify = event.SelectionNotify(time=e.time, requestor=requestor, selection=e.selection,
+                                       target=e.target, property=prop)
+        requestor.send_event(notify)
+        self.display.flush()
+
+    def _handle_property_notify(self, e):
+        key = (e.window.id, e.atom)
+        if e.state == X.PropertyDelete and key in self._incr_out:
+            # 对方读走了上一块，发送下一块；空块表示结束
+            type_atom, data, offset = self._incr_out[key]
+            chunk = data[offset:offset + INCR_CHUNK]
+            e.window.change_property(e.atom, type_atom, 8, chunk)
+            if chunk:
+                self._incr_out[key] = (type_atom, data, offset + len(chunk))
+            else:
+                del self._incr_out[key]
+            self.display.flush()
+        elif (e.state == X.PropertyNewValue and self._incr_in is not None
+              and e.window.id == self._owner.id and e.atom == self._atom('_GROK_PASTE')):
+            prop = self._owner.get_full_property(e.atom, X.AnyPropertyType)
+            self._owner.delete_property(e.atom)
+            chunk = prop.value if prop else b""
+            if chunk:
+                self._incr_in.append(bytes(chunk))
+            else:
+                self._finish_paste(b"".join(self._incr_in))
+                self._incr_in = None
+
+    def _handle_selection_notify(self, e):
+        if e.property == X.NONE:
+            self._finish_paste(b"")
+            return
+        prop = self._owner.get_full_property(e.property, X.AnyPropertyType)
+        self._owner.delete_property(e.property)
+        if prop is not None and prop.property_type == self._atom('INCR'):
+            self._incr_in = []
+        else:
+            self._finish_paste(bytes(prop.value) if prop else b"")
+        self.display.flush()
+
+    def _finish_paste(self, data):
+        self._paste_result = data.decode('utf-8', errors='replace')
+        self._paste_done.set()
@@ -3,8 +3,10 @@ import logging
 from fastapi import FastAPI, HTTPException, Header, Request
 from pydantic import BaseModel, ValidationError, Field
 from typing import List, Optional, Union
+import os
 import time
 from grok3_api import GrokAPI, check_dependencies   
+from grok_tokens import TokenCounter, ContextBudgetError, OVERFLOW_MODES, fit_to_budget
 from contextlib import asynccontextmanager
 
 # Set up logging to file and terminal
@@ -18,12 +20,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Check dependencies at startup
-if not check_dependencies():
-    raise RuntimeError("Missing dependencies (xdotool, xclip, imagemagick)")
+# GROK_BACKEND=cdp drives the browser over the DevTools protocol instead of screenshots
+if os.environ.get("GROK_BACKEND") == "cdp":
+    from grok_cdp import CDPGrokAPI
+    grok_api = CDPGrokAPI(reuse_window=True)
+else:
+    # Check dependencies at startup
+    if not check_dependencies():
+        raise RuntimeError("Missing automation dependencies (see check_dependencies)")
 
-# Initialize GrokAPI with reuse_window=True
-grok_api = GrokAPI(reuse_window=True)
+    # Initialize GrokAPI with reuse_window=True
+    grok_api = GrokAPI(reuse_window=True)
+
+# Token accounting; the context budget is enforced before anything is sent to Grok.
+# GROK_CONTEXT_OVERFLOW=trim drops the oldest non-system messages, =reject returns 400.
+CONTEXT_TOKENS = int(os.environ.get("GROK_CONTEXT_TOKENS", "131072"))
+CONTEXT_OVERFLOW = os.environ.get("GROK_CONTEXT_OVERFLOW", "trim")
+if CONTEXT_OVERFLOW not in OVERFLOW_MODES:
+    raise RuntimeError(f"GROK_CONTEXT_OVERFLOW must be one of {OVERFLOW_MODES}, got {CONTEXT_OVERFLOW!r}")
+token_counter = TokenCounter()
 
 # Model for message content (string or list of objects)
 class ContentItem(BaseModel):
@@ -39,7 +54,7 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     model: str
     messages: List[Message]
-    max_tokens: Optional[int] = None
+    max_tokens: Optional[int] = Field(None, gt=0, description="Completion token limit, at least 1")
     files: Optional[List[str]] = None
     temperature: Optional[float] = None  # Support for field from Roo Code request
     stream: Optional[bool] = None
@@ -64,7 +79,7 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
 
 @app.post("/v1/chat/completions")
 async def chat_completions(request: Request, authorization: str = Header(default=None)):
-    
+    body = await request.json()
     # logger.info(f"Received request body: {body}")
     # logger.info(f"Authorization header: {authorization}")
 
@@ -75,18 +90,30 @@ async def chat_completions(request: Request, authorization: str = Header(default
         logger.error(f"Failed to parse request: {str(e)}")
         raise HTTPException(status_code=422, detail=str(e))
 
-    # Collect the full text of all messages, including system context and environment_details
-    full_message = ""
+    # Collect the text of all messages, including system context and environment_details
+    messages = []
     for msg in parsed_request.messages:
         if isinstance(msg.content, str):
-            full_message += f"{msg.role}: {msg.content}\n"
+            messages.append((msg.role, msg.content))
         elif isinstance(msg.content, list):
-            full_message += f"{msg.role}: " + "\n".join(item.text for item in msg.content if isinstance(item, ContentItem)) + "\n"
+            messages.append((msg.role, "\n".join(item.text for item in msg.content if isinstance(item, ContentItem))))
     
-    if not full_message:
+    if not messages:
         logger.error("No messages found in request")
         raise HTTPException(status_code=400, detail="No messages found in request")
- 
+
+    # Fit the prompt into the context budget, leaving room for max_tokens of completion
+    if parsed_request.max_tokens and parsed_request.max_tokens >= CONTEXT_TOKENS:
+        logger.error(f"max_tokens {parsed_request.max_tokens} leaves no room for the prompt")
+        raise HTTPException(status_code=400, detail=f"max_tokens ({parsed_request.max_tokens}) must be smaller "
+                                                    f"than the context size ({CONTEXT_TOKENS} tokens)")
+    budget = CONTEXT_TOKENS - (parsed_request.max_tokens or 0)
+    try:
+        messages, prompt_tokens = fit_to_budget(messages, token_counter, budget, CONTEXT_OVERFLOW)
+    except ContextBudgetError as e:
+        logger.error(f"Context budget exceeded: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"context_length_exceeded: {str(e)}")
+    full_message = "".join(f"{role}: {text}\n" for role, text in messages)
 
     # Send the full text to GrokAPI
     file_paths = parsed_request.files if parsed_request.files else None
@@ -100,6 +127,14 @@ async def chat_completions(request: Request, authorization: str = Header(default
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+    # Grok cannot be told to stop early, so max_tokens is applied to the copied answer
+    finish_reason = "stop"
+    completion_tokens = token_counter.count(response)
+    if parsed_request.max_tokens and completion_tokens > parsed_request.max_tokens:
+        response = token_counter.truncate(response, parsed_request.max_tokens)
+        completion_tokens = token_counter.count(response)
+        finish_reason = "length"
+
     # Format the response in OpenAI format
     response_dict = {
         "id": f"chatcmpl-{int(time.time())}",
@@ -112,12 +147,12 @@ async def chat_completions(request: Request, authorization: str = Header(default
                 "role": "assistant",
                 "content": response
             },
-            "finish_reason": "stop"
+            "finish_reason": finish_reason
         }],
         "usage": {
-            "prompt_tokens": len(full_message.split()),
-            "completion_tokens": len(response.split()),
-            "total_tokens": len(full_message.split()) + len(response.split())
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
         }
     }
     # logger.info(f"Returning response: {response_dict}")
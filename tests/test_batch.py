@@ -0,0 +1,112 @@
+import json
+
+import grok3_api
+
+
+class FakeAPI:
+    """Answers every prompt; raises or fails for prompts listed in ``fail``."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+        self.opened = 0
+        self.connected = False
+
+    def _open_browser(self):
+        self.opened += 1
+        self.connected = True
+        return 1
+
+    def send_message(self, message, file_paths=None):
+        if message == "raise":
+            raise RuntimeError("backend exploded")
+        if message == "drop":
+            self.connected = False
+        if not self.connected:
+            return False
+        self.sent.append(message)
+        return True
+
+    def get_response(self, timeout=60):
+        message = self.sent[-1]
+        return "Error: Timeout waiting for response" if message in self.fail else f"answer:{message}"
+
+
+def _records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_invalid_lines_and_backend_errors_do_not_abort(tmp_path):
+    out = str(tmp_path / "out.jsonl")
+    lines = [
+        '{"id": "a", "message": null}\n',
+        '{"id": "b", "message": "x", "files": "notalist"}\n',
+        '{"id": "c", "message": "raise"}\n',
+        '{"id": "d", "message": "ok"}\n',
+    ]
+    stats = grok3_api.run_batch(FakeAPI(), lines, out)
+    assert stats == {'done': 1, 'cached': 0, 'skipped': 0, 'failed': 1, 'invalid': 2}
+    records = {r['id']: r for r in _records(out)}
+    assert records['a']['final'] and "'message'" in records['a']['error']
+    assert records['b']['final'] and "'files'" in records['b']['error']
+    assert records['c'] == {'id': 'c', 'message': 'raise', 'error': 'Error: backend exploded', 'final': False}
+    assert records['d']['response'] == "answer:ok" and records['d']['final']
+
+
+def test_resume_skips_done_and_tolerates_truncated_checkpoint(tmp_path):
+    out = str(tmp_path / "out.jsonl")
+    cache = str(tmp_path / "cache.jsonl")
+    lines = ['{"id": "2", "message": "explicit"}\n', 'plain text\n', '{"message": "flaky"}\n']
+
+    first = grok3_api.run_batch(FakeAPI(fail={"flaky"}), lines, out, cache_path=cache)
+    assert first['done'] == 2 and first['failed'] == 1
+    # 崩溃可能留下半行记录
+    with open(out + ".ckpt", 'a', encoding='utf-8') as f:
+        f.write('{"id":"z"')
+    with open(cache, 'a', encoding='utf-8') as f:
+        f.write('{"key": "abc", "resp')
+
+    api = FakeAPI()
+    second = grok3_api.run_batch(api, lines, out, cache_path=cache)
+    # 隐式 ID "line:2" 不会与显式 ID "2" 冲突
+    assert second == {'done': 1, 'cached': 0, 'skipped': 2, 'failed': 0, 'invalid': 0}
+    assert api.sent == ["flaky"]
+
+    flaky = [r for r in _records(out) if r['id'] == "line:3"]
+    assert [r['final'] for r in flaky] == [False, True]
+    assert {r['id'] for r in _records(out)} == {"2", "line:2", "line:3"}
+
+    # 第三次运行：所有提示都已完成
+    third = grok3_api.run_batch(FakeAPI(), lines, out, cache_path=cache)
+    assert third['skipped'] == 3
+
+
+def test_reopens_browser_after_failed_attempt(tmp_path):
+    out = str(tmp_path / "out.jsonl")
+    api = FakeAPI()
+    lines = ['ok 1\n', 'drop\n', 'ok 2\n', 'ok 3\n', 'ok 4\n']
+    stats = grok3_api.run_batch(api, lines, out)
+    # 连接断开只影响当前请求，之后重新打开浏览器
+    assert stats == {'done': 4, 'cached': 0, 'skipped': 0, 'failed': 1, 'invalid': 0}
+    assert api.opened == 2
+    assert api.sent == ["ok 1", "ok 2", "ok 3", "ok 4"]
+
+
+def test_cache_answers_repeated_prompts_without_sending(tmp_path):
+    cache = str(tmp_path / "cache.jsonl")
+    lines = ['{"id": "q1", "message": "same question"}\n', '{"id": "q2", "message": "other"}\n']
+    first = grok3_api.run_batch(FakeAPI(), lines, str(tmp_path / "first.jsonl"), cache_path=cache)
+    assert first['done'] == 2 and first['cached'] == 0
+
+    # 新的输出和检查点文件，只有缓存是共享的
+    api = FakeAPI()
+    out = str(tmp_path / "second.jsonl")
+    second = grok3_api.run_batch(api, lines + ['{"id": "q3", "message": "new"}\n'], out,
+                                 checkpoint_path=str(tmp_path / "second.ckpt"), cache_path=cache)
+    assert second == {'done': 1, 'cached': 2, 'skipped': 0, 'failed': 0, 'invalid': 0}
+    assert api.sent == ["new"]
+    records = {r['id']: r for r in _records(out)}
+    assert records['q1'] == {'id': 'q1', 'message': 'same question', 'response': 'answer:same question',
+                             'cached': True, 'final': True}
+    assert records['q3']['response'] == "answer:new" and 'cached' not in records['q3']
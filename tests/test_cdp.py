@@ -0,0 +1,260 @@
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from grok_cdp import BINDING_NAME, CDPGrokAPI
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class MockPage:
+    """Static stand-in for the Grok page: message bubbles plus a busy flag.
+
+    ``script`` is a list of ``(delay, text, busy)`` steps played after the prompt
+    is submitted; each step replaces the text of the assistant bubble.
+    """
+
+    def __init__(self, script, echo=True):
+        self.script = script
+        self.echo = echo
+        self.bubbles = ["earlier answer"]
+        self.busy = False
+        self.input = ""
+
+    def state(self):
+        return {"count": len(self.bubbles), "text": self.bubbles[-1], "busy": self.busy}
+
+
+class StandInCDPServer:
+    """Minimal DevTools endpoint: /json HTTP routes and one page WebSocket."""
+
+    def __init__(self, page):
+        self.page = page
+        self.methods = []
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen()
+        self.port = self._sock.getsockname()[1]
+        self._send_lock = threading.Lock()
+        self._conns = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def target(self):
+        return {"id": "PAGE1", "type": "page", "url": "https://grok.com/",
+                "webSocketDebuggerUrl": f"ws://127.0.0.1:{self.port}/devtools/page/PAGE1"}
+
+    def close(self):
+        self._sock.close()
+        self.drop_connections()
+
+    def drop_connections(self):
+        for conn in self._conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            except OSError:
+                pass
+        self._conns = []
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+        lines = request.decode().split("\r\n")
+        path = lines[0].split()[1]
+        headers = {k.lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+        if headers.get("upgrade", "").lower() == "websocket":
+            accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest())
+            conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            self._conns.append(conn)
+            self._serve_ws(conn)
+            return
+        body = json.dumps([self.target] if path.startswith("/json/list") else self.target).encode()
+        conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                     + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+        conn.close()
+
+    # --- WebSocket framing ---
+
+    @staticmethod
+    def _recv_exact(conn, n):
+        data = b""
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _recv_frame(self, conn):
+        b1, b2 = self._recv_exact(conn, 2)
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self._recv_exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._recv_exact(conn, 8))[0]
+        mask = self._recv_exact(conn, 4) if b2 & 0x80 else b"\0\0\0\0"
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(conn, length)))
+        return b1 & 0x0F, payload
+
+    def send(self, conn, message):
+        data = json.dumps(message).encode()
+        if len(data) < 126:
+            header = struct.pack(">BB", 0x81, len(data))
+        elif len(data) < 65536:
+            header = struct.pack(">BBH", 0x81, 126, len(data))
+        else:
+            header = struct.pack(">BBQ", 0x81, 127, len(data))
+        with self._send_lock:
+            conn.sendall(header + data)
+
+    def notify(self, conn):
+        self.send(conn, {"method": "Runtime.bindingCalled",
+                         "params": {"name": BINDING_NAME, "payload": json.dumps(self.page.state())}})
+
+    def _serve_ws(self, conn):
+        try:
+            while True:
+                opcode, payload = self._recv_frame(conn)
+                if opcode == 0x8:
+                    with self._send_lock:
+                        conn.sendall(b"\x88\x00")
+                    return
+                message = json.loads(payload)
+                self.methods.append(message["method"])
+                self._dispatch(conn, message)
+        except (ConnectionError, OSError):
+            return
+
+    def _dispatch(self, conn, message):
+        method, params = message["method"], message.get("params", {})
+        result = {}
+        if method == "Runtime.evaluate":
+            expression = params["expression"]
+            if expression.startswith("!!document.querySelector"):
+                result = {"result": {"type": "boolean", "value": True}}
+            else:
+                result = {"result": {"type": "undefined"}}
+        elif method == "Input.insertText":
+            self.page.input += params["text"]
+        self.send(conn, {"id": message["id"], "result": result})
+        if method == "Runtime.evaluate" and "notify" in params["expression"]:
+            self.notify(conn)
+        if method == "Input.dispatchKeyEvent" and params["type"] == "keyUp" and params["key"] == "Enter":
+            threading.Thread(target=self._play, args=(conn,), daemon=True).start()
+
+    def _play(self, conn):
+        page = self.page
+        try:
+            if page.echo:
+                page.bubbles.append(page.input)
+                self.notify(conn)
+            if page.script:
+                page.bubbles.append("")
+            for delay, text, busy in page.script:
+                time.sleep(delay)
+                page.bubbles[-1] = text
+                page.busy = busy
+                self.notify(conn)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def cdp_server():
+    servers = []
+
+    def start(script, echo=True):
+        server = StandInCDPServer(MockPage(script, echo=echo))
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _client(server, **kwargs):
+    kwargs.setdefault("settle_time", 0.2)
+    return CDPGrokAPI(debug_port=server.port, launch_browser=False, reuse_window=True, **kwargs)
+
+
+def test_send_and_stream_response(cdp_server):
+    server = cdp_server([(0.05, "Hel", True), (0.05, "Hello", True), (0.05, "Hello world", True),
+                         (0.05, "Hello world", False)])
+    deltas = []
+    api = _client(server, on_delta=deltas.append)
+    assert api._open_browser() == "PAGE1"
+    assert api.send_message("what is up")
+    assert server.page.input == "what is up"
+    assert api.get_response(timeout=5) == "Hello world"
+    # 回显的提问不计入流式输出
+    assert deltas == ["Hel", "lo", " world"]
+    assert "Input.insertText" in server.methods
+    api.close()
+
+
+def test_waits_while_busy_then_settles(cdp_server):
+    server = cdp_server([(0.05, "partial", True), (0.8, "partial", False)])
+    api = _client(server)
+    api._open_browser()
+    assert api.send_message("slow one")
+    start = time.time()
+    assert api.get_response(timeout=5) == "partial"
+    # 忙碌期间即使文本不变也不能提前返回，结束后还要等待 settle_time
+    assert time.time() - start >= 0.8 + 0.2 - 0.05
+    api.close()
+
+
+def test_echo_of_prompt_is_not_a_response(cdp_server):
+    server = cdp_server([], echo=True)
+    deltas = []
+    api = _client(server, on_delta=deltas.append)
+    api._open_browser()
+    assert api.send_message("just the echo")
+    # 只出现了用户消息的回显，没有回答
+    assert api.get_response(timeout=1.0) == "Error: Timeout waiting for response"
+    assert server.page.bubbles[-1] == "just the echo"
+    assert deltas == []
+    api.close()
+
+
+def test_timeout_without_response(cdp_server):
+    server = cdp_server([(0.05, "never finishes", True)])
+    api = _client(server)
+    api._open_browser()
+    assert api.send_message("hang")
+    start = time.time()
+    assert api.get_response(timeout=0.6) == "Error: Timeout waiting for response"
+    assert time.time() - start < 2.0
+    api.close()
+
+
+def test_reconnects_after_connection_drop(cdp_server):
+    server = cdp_server([(0.05, "second answer", False)])
+    api = _client(server)
+    api._open_browser()
+    server.drop_connections()
+    assert api.send_message("lost") is False
+    assert api._ws is None
+    assert api.ask("again", timeout=5, close_after=False) == "second answer"
+    api.close()
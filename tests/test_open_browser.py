@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import grok3_api
+from test_trace import FakeAutomation
+
+TERMINAL = 7
+BROWSER = 99
+
+
+class LaunchAutomation(FakeAutomation):
+    """The terminal keeps focus; the browser window shows up by title after a few polls."""
+
+    def __init__(self, title_after=None, focus_browser=False):
+        super().__init__((0, 0))
+        self.title_after = title_after
+        self.focus_browser = focus_browser
+        self.polls = 0
+
+    def get_active_window(self):
+        return BROWSER if self.focus_browser and self.polls else TERMINAL
+
+    def find_window(self, title):
+        self.polls += 1
+        return BROWSER if self.title_after is not None and self.polls >= self.title_after else None
+
+
+class FakeProcess:
+    def __init__(self, args):
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def launch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(grok3_api.shutil, "which", lambda name: "/bin/true" if name == "chromium" else None)
+    monkeypatch.setattr(grok3_api.subprocess, "Popen", FakeProcess)
+
+    def open_with(automation):
+        api = grok3_api.GrokAPI(automation=automation)
+        api._sleep = lambda seconds: None
+        return api._open_browser()
+    return open_with
+
+
+@pytest.mark.skipif(grok3_api.sys.platform == "win32", reason="uses the Linux browser lookup")
+def test_keeps_polling_title_instead_of_taking_the_terminal(launch):
+    automation = LaunchAutomation(title_after=4)
+    assert launch(automation) == BROWSER
+    assert automation.polls == 4
+    with open(grok3_api.WINDOW_ID_FILE) as f:
+        assert f.read() == str(BROWSER)
+
+
+@pytest.mark.skipif(grok3_api.sys.platform == "win32", reason="uses the Linux browser lookup")
+def test_falls_back_to_newly_focused_window(launch):
+    assert launch(LaunchAutomation(focus_browser=True)) == BROWSER
+
+
+@pytest.mark.skipif(grok3_api.sys.platform == "win32", reason="uses the Linux browser lookup")
+def test_never_takes_the_window_that_was_active_before_launch(launch):
+    # 焦点一直停留在终端时不能把终端当成浏览器窗口
+    assert launch(LaunchAutomation()) is None
+    assert not os.path.exists(grok3_api.WINDOW_ID_FILE)
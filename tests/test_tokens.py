@@ -0,0 +1,45 @@
+import pytest
+
+from grok_tokens import ContextBudgetError, TokenCounter, fit_to_budget
+
+
+@pytest.fixture
+def counter():
+    counter = TokenCounter()
+    counter.encoder = None  # 固定使用内置估算，结果与是否安装 tiktoken 无关
+    return counter
+
+
+def test_heuristic_counts_cjk_and_underscores(counter):
+    assert counter.count("你好世界") == 4
+    assert counter.count("hello world") == 4
+    assert counter.count("snake_case_name") == counter.count("snake case name") + 2
+    assert counter.count("__") == 2
+
+
+def test_counts_are_cached(counter, monkeypatch):
+    counter.count("cached message")
+    monkeypatch.setattr(counter, "_count", lambda text: pytest.fail("recounted"))
+    assert counter.count("cached message") > 0
+
+
+def test_truncate(counter):
+    assert counter.truncate("abc 你好世界 def", 3) == "abc 你好"
+    assert counter.truncate("short", 10) == "short"
+
+
+def test_trim_drops_oldest_non_system_messages(counter):
+    messages = [("system", "s"), ("user", "a " * 100), ("assistant", "b " * 100), ("user", "hi")]
+    kept, total = fit_to_budget(messages, counter, 60)
+    assert [role for role, _ in kept] == ["system", "user"]
+    assert kept[-1] == ("user", "hi") and total <= 60
+
+
+def test_reject_and_unknown_mode(counter):
+    messages = [("user", "a " * 100)]
+    with pytest.raises(ContextBudgetError):
+        fit_to_budget(messages, counter, 10, "reject")
+    with pytest.raises(ContextBudgetError):
+        fit_to_budget(messages, counter, 10, "trim")
+    with pytest.raises(ValueError, match="overflow mode"):
+        fit_to_budget(messages, counter, 10, "trimm")
@@ -0,0 +1,194 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import grok3_api
+from grok_automation import Automation
+from grok_trace import TraceRecorder, read_trace, trace_segments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANSWER = "recorded answer"
+
+
+def _frame(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, (60, 80, 4), dtype=np.uint8)
+
+
+def test_read_trace_decodes_deltas_and_keyframes(tmp_path):
+    path = str(tmp_path / "t.bin")
+    frames = []
+    frame = _frame(0)
+    with TraceRecorder(path, keyframe_interval=2) as recorder:
+        for i in range(6):
+            frame = frame.copy()
+            frame[i, i] = 7
+            frames.append(frame)
+            recorder.record_frame(frame)
+        recorder.record_frame(_frame(1)[:30])  # 尺寸变化强制关键帧
+        frames.append(_frame(1)[:30])
+        recorder.record_action('click', (1, np.int64(2)), True)
+
+    events = list(read_trace(path))
+    decoded = [e for e in events if e['kind'] == 'frame']
+    assert [e['key'] for e in decoded] == [True, False, False, True, False, False, True]
+    for event, expected in zip(decoded, frames):
+        assert np.array_equal(event['frame'], expected)
+    assert events[-1] == {'kind': 'action', 'action': 'click', 'args': [1, 2], 'result': True, 't': events[-1]['t']}
+
+
+def test_rotation_keeps_newest_segments_starting_with_keyframe(tmp_path):
+    path = str(tmp_path / "t.bin")
+    frame = _frame(0)
+    with TraceRecorder(path, max_bytes=60_000, segments=3) as recorder:
+        for i in range(40):
+            frame = frame.copy()
+            frame[:, i] = i
+            recorder.record_frame(frame)
+            recorder.record_action('key', ('end',), True)
+        recorder.record_action('key', ('last',), True)
+
+    assert recorder.dropped_segments > 0
+    segments = trace_segments(path)
+    assert len(segments) == 3
+    assert sum(os.path.getsize(s) for s in segments) <= 60_000 + 20_000
+    for segment in segments:
+        frames = [e for e in read_trace(segment) if e['kind'] == 'frame']
+        assert not frames or frames[0]['key']
+    events = list(read_trace(path))
+    assert events[-1]['args'] == ['last']
+    assert np.array_equal([e for e in events if e['kind'] == 'frame'][-1]['frame'], frame)
+
+
+class FakeAutomation(Automation):
+    """Screen-less backend: clicking the copy button puts the answer on the clipboard."""
+
+    def __init__(self, copy_pos):
+        self.copy_pos = copy_pos
+        self.clipboard = ""
+
+    def run(self, action, *args):
+        if action == 'click' and abs(args[0] - self.copy_pos[0]) < 5 and abs(args[1] - self.copy_pos[1]) < 5:
+            self.clipboard = ANSWER
+        return True
+
+    def get_active_window(self):
+        return 42
+
+    def activate_window(self, window_id):
+        return True
+
+    def is_window(self, window_id):
+        return True
+
+    def get_window_rect(self, window_id):
+        return (0, 0, 800, 600)
+
+    def clipboard_copy(self, text):
+        self.clipboard = text
+
+    def clipboard_paste(self):
+        return self.clipboard
+
+    def clipboard_copy_image(self, file_path):
+        return False
+
+
+class RecordingAPI(grok3_api.GrokAPI):
+    """GrokAPI on a virtual clock that captures synthetic frames."""
+
+    def __init__(self, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.frames = frames
+        self.now = 0.0
+
+    def _sleep(self, seconds):
+        self.now += seconds
+
+    def _clock(self):
+        return self.now
+
+    def _grab_screenshot(self):
+        frame = self.frames[min(int(self.now), len(self.frames) - 1)]
+        return frame
+
+
+def _ui_frames():
+    input_field = cv2.imread(os.path.join(ROOT, "grok_templates", "input_field.png"))
+    copy_button = cv2.imread(os.path.join(ROOT, "grok_templates", "copy_button.png"))
+    frames = []
+    for i in range(80):
+        frame = np.full((600, 800, 4), 255, np.uint8)
+        frame[100:100 + input_field.shape[0], 50:50 + input_field.shape[1], :3] = input_field
+        frame[400:400 + copy_button.shape[0], 50:50 + copy_button.shape[1], :3] = copy_button
+        frame[590, i] = 0  # 每秒变化一点，产生差分帧
+        frames.append(frame)
+    copy_pos = (50 + copy_button.shape[1] // 2, 400 + copy_button.shape[0] // 2)
+    return frames, copy_pos
+
+
+@pytest.fixture
+def ui_frames():
+    return _ui_frames()
+
+
+def test_record_then_replay_reproduces_response(tmp_path, monkeypatch, ui_frames):
+    monkeypatch.chdir(ROOT)
+    frames, copy_pos = ui_frames
+    path = str(tmp_path / "session.bin")
+
+    api = RecordingAPI(frames, automation=FakeAutomation(copy_pos), trace_path=path)
+    api.window_id = 42
+    assert api.send_message("hello")
+    recorded = api.get_response(timeout=60)
+    api.close_trace()
+    assert recorded == ANSWER
+
+    events = list(read_trace(path))
+    frame_events = [e for e in events if e['kind'] == 'frame']
+    assert frame_events[0]['key'] and not all(e['key'] for e in frame_events)
+
+    replay = grok3_api.ReplayGrokAPI(path)
+    assert replay.replay() == ANSWER
+    assert replay.stats['action_mismatches'] == 0
+    assert replay.stats['frames'] == len(frame_events)
+
+
+def test_automation_is_abstract_and_replay_backend_is_complete():
+    with pytest.raises(TypeError):
+        Automation()
+    backend = grok3_api.ReplayAutomation()
+    assert backend.is_window(1) and backend.get_window_rect(1) == (0, 0, 0, 0)
+    assert backend.clipboard_copy_image("missing.png") is False
+    backend.clipboard_copy("x")
+    assert backend.clipboard_paste() == "x"
+
+
+def test_replay_after_rotation_starts_at_first_kept_call(tmp_path, monkeypatch, ui_frames):
+    monkeypatch.chdir(ROOT)
+    frames, copy_pos = ui_frames
+    path = str(tmp_path / "session.bin")
+
+    api = RecordingAPI(frames, automation=FakeAutomation(copy_pos), trace_path=path, trace_max_bytes=300_000)
+    api.window_id = 42
+    for turn in range(4):
+        api.now = 0.0
+        api.automation.clipboard = ""  # 每轮的回答都要与原剪贴板不同
+        assert api.send_message(f"turn {turn}")
+        assert api.get_response(timeout=60) == ANSWER
+    dropped = api.recorder.dropped_segments
+    api.close_trace()
+
+    events = list(read_trace(path))
+    assert dropped > 0
+    # 第一个保留的分段从某次调用的中途开始
+    assert events[1]['kind'] != 'call'
+    calls = [e for e in events if e['kind'] == 'call']
+    assert len(calls) > 2
+
+    replay = grok3_api.ReplayGrokAPI(path)
+    assert replay.replay() == ANSWER
+    assert replay.stats['action_mismatches'] == 0
+    assert replay.stats['actions'] > 0 and replay.stats['frames'] > 0
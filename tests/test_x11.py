@@ -0,0 +1,232 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+Xlib = pytest.importorskip("Xlib")
+
+from Xlib import X, display  # noqa: E402
+from Xlib.protocol import event  # noqa: E402
+
+from grok_x11 import INCR_CHUNK, X11Automation  # noqa: E402
+
+LARGE_TEXT = "大段文本 large payload " * (INCR_CHUNK // 10)
+
+
+@pytest.fixture(scope="module")
+def xvfb():
+    """Start a bare Xvfb server (no window manager) on a free display number."""
+    if shutil.which("Xvfb") is None:
+        pytest.skip("Xvfb is not installed")
+    number = next(n for n in range(90, 200) if not os.path.exists(f"/tmp/.X11-unix/X{n}"))
+    name = f":{number}"
+    proc = subprocess.Popen(["Xvfb", name, "-screen", "0", "1024x768x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            display.Display(name).close()
+            break
+        except Exception:
+            time.sleep(0.05)
+    else:
+        proc.kill()
+        pytest.skip("Xvfb did not start")
+    yield name
+    proc.terminate()
+    proc.wait(timeout=5)
+
+
+@pytest.fixture
+def automation(xvfb):
+    backend = X11Automation(xvfb)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def client(xvfb):
+    """A separate X connection playing the part of another application."""
+    d = display.Display(xvfb)
+    yield d
+    d.close()
+
+
+def _window(d, title="test window", x=0, y=0, size=200):
+    root = d.screen().root
+    window = root.create_window(x, y, size, size, 0, X.CopyFromParent,
+                                event_mask=X.KeyPressMask | X.KeyReleaseMask | X.ButtonPressMask
+                                | X.PropertyChangeMask)
+    window.set_wm_name(title)
+    window.map()
+    d.sync()
+    return window
+
+
+def _wait_event(d, predicate, timeout=2.0, on_event=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        while d.pending_events():
+            e = d.next_event()
+            if e.type == X.MappingNotify:
+                d.refresh_keyboard_mapping(e)
+            if on_event:
+                on_event(e)
+            if predicate(e):
+                return e
+        time.sleep(0.005)
+    return None
+
+
+def _typed(d, events):
+    """Keysyms of KeyPress events, taking Shift into account."""
+    return [d.keycode_to_keysym(e.detail, 1 if e.state & X.ShiftMask else 0)
+            for e in events if e.type == X.KeyPress]
+
+
+def test_key_type_and_click_reach_test_window(automation, client):
+    window = _window(client)
+    assert automation.activate_window(window.id)
+
+    events = []
+    assert not automation.run('key', 'no_such_key')  # 拼错的键名不能报告成功
+    assert not automation.run('type', ['a', 'no_such_key'])
+    assert automation.run('key', 'a')
+    assert automation.run('type', 'Hi\n')
+    assert automation.run('type', '中')  # 没有映射的字符要临时重映射键码
+    assert automation.run('click', 10, 10)
+    _wait_event(client, lambda e: e.type == X.ButtonPress, on_event=events.append)
+
+    keysyms = [k for k in _typed(client, events) if k != 0xffe1]  # 忽略 Shift_L 本身
+    assert keysyms == [ord('a'), ord('H'), ord('i'), 0xff0d, 0x01004e2d]
+    press = [e for e in events if e.type == X.ButtonPress]
+    assert press and press[0].detail == 1 and (press[0].event_x, press[0].event_y) == (10, 10)
+    # 每个按键都有对应的释放
+    assert sum(e.type == X.KeyRelease for e in events) == sum(e.type == X.KeyPress for e in events)
+
+
+def test_unknown_key_names_fail():
+    with pytest.raises(ValueError):
+        X11Automation._keysym(None, "no_such_key")
+    assert X11Automation._keysym(None, "enter") == 0xff0d
+    assert X11Automation._keysym(None, "中") == 0x01004e2d
+
+
+def _request_clipboard(d, window):
+    """Read CLIPBOARD as UTF8_STRING the way another application would, following INCR."""
+    clipboard, utf8 = d.intern_atom('CLIPBOARD'), d.intern_atom('UTF8_STRING')
+    prop, incr = d.intern_atom('TEST_PASTE'), d.intern_atom('INCR')
+    window.convert_selection(clipboard, utf8, prop, X.CurrentTime)
+    d.flush()
+    notify = _wait_event(d, lambda e: e.type == X.SelectionNotify)
+    assert notify is not None and notify.property == prop
+    reply = window.get_full_property(prop, X.AnyPropertyType)
+    if reply.property_type != incr:
+        window.delete_property(prop)
+        d.flush()
+        return bytes(reply.value).decode('utf-8'), False
+    chunks = []
+    window.delete_property(prop)  # 删除 INCR 属性表示开始接收
+    d.flush()
+    while True:
+        e = _wait_event(d, lambda e: e.type == X.PropertyNotify and e.atom == prop
+                        and e.state == X.PropertyNewValue)
+        assert e is not None, "INCR transfer stalled"
+        chunk = window.get_full_property(prop, X.AnyPropertyType)
+        window.delete_property(prop)
+        d.flush()
+        if not chunk or not len(chunk.value):
+            return b"".join(chunks).decode('utf-8'), True
+        chunks.append(bytes(chunk.value))
+
+
+@pytest.mark.parametrize("text, incr", [("hello 你好", False), (LARGE_TEXT, True)])
+def test_clipboard_copy_served_to_other_client(automation, client, text, incr):
+    window = _window(client, "requestor")
+    assert automation.clipboard_copy(text)
+    assert automation.clipboard_paste() == text  # 自己持有时直接返回
+    received, used_incr = _request_clipboard(client, window)
+    assert received == text
+    assert used_incr == incr
+
+
+class _ExternalOwner:
+    """Owns CLIPBOARD from another connection and serves it, with INCR for large data."""
+
+    def __init__(self, name, text):
+        self.d = display.Display(name)
+        self.data = text.encode('utf-8')
+        self.window = self.d.screen().root.create_window(0, 0, 1, 1, 0, X.CopyFromParent)
+        self.clipboard = self.d.intern_atom('CLIPBOARD')
+        self.utf8 = self.d.intern_atom('UTF8_STRING')
+        self.incr = self.d.intern_atom('INCR')
+        self.window.set_selection_owner(self.clipboard, X.CurrentTime)
+        self.d.sync()
+        self._pending = None
+        self._stop = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stop:
+            if not self.d.pending_events():
+                time.sleep(0.005)
+                continue
+            e = self.d.next_event()
+            if e.type == X.SelectionRequest:
+                requestor = e.requestor
+                if len(self.data) > INCR_CHUNK:
+                    requestor.change_attributes(event_mask=X.PropertyChangeMask)
+                    requestor.change_property(e.property, self.incr, 32, [len(self.data)])
+                    self._pending = (requestor, e.property, 0)
+                else:
+                    requestor.change_property(e.property, self.utf8, 8, self.data)
+                requestor.send_event(event.SelectionNotify(time=e.time, requestor=requestor, selection=e.selection,
+                                                           target=e.target, property=e.property))
+                self.d.flush()
+            elif e.type == X.PropertyNotify and e.state == X.PropertyDelete and self._pending:
+                requestor, prop, offset = self._pending
+                if e.window.id != requestor.id or e.atom != prop:
+                    continue
+                chunk = self.data[offset:offset + INCR_CHUNK]
+                requestor.change_property(prop, self.utf8, 8, chunk)
+                self._pending = (requestor, prop, offset + len(chunk)) if chunk else None
+                self.d.flush()
+
+    def close(self):
+        self._stop = True
+        self._thread.join(timeout=1)
+        self.d.close()
+
+
+@pytest.mark.parametrize("text", ["from another owner", LARGE_TEXT])
+def test_clipboard_paste_from_other_owner(automation, xvfb, text):
+    automation.clipboard_copy("ours first")
+    owner = _ExternalOwner(xvfb, text)
+    try:
+        # 失去所有权后必须向新的持有者请求内容
+        time.sleep(0.05)
+        assert automation.clipboard_paste() == text
+    finally:
+        owner.close()
+
+
+def test_find_and_activate_window_without_window_manager(automation, client):
+    grok = _window(client, "Grok - Browser", x=30, y=40, size=100)
+    other = _window(client, "Something else", x=300, y=300, size=50)
+
+    assert automation.find_window("grok") == grok.id
+    assert automation.find_window("no such title") is None
+    assert automation.is_window(grok.id)
+    assert automation.get_window_rect(grok.id) == (30, 40, 130, 140)
+
+    assert automation.activate_window(other.id)
+    assert automation.get_active_window() == other.id
+    assert automation.activate_window(grok.id)
+    assert automation.get_active_window() == grok.id
+
+    grok.destroy()
+    client.sync()
+    assert not automation.is_window(grok.id)